@@ -0,0 +1,112 @@
+"""
+Benchmark della serializzazione e della compressione delle risposte di /results.
+
+Confronta il percorso precedente (modello AnalysisResult + jsonable_encoder + JSONResponse, senza
+compressione) con quello attuale (FastJSONResponse + compressione negoziata) su un risultato
+sintetico delle dimensioni di un dataset omico reale.
+
+Uso:
+    python benchmark_responses.py [--features 20000] [--lambdas 100] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fastapi_main
+from fastapi_main import AnalysisResult, FastJSONResponse, GzipCompressor, BrotliCompressor
+
+
+def synthetic_results(features: int, lambdas: int) -> dict:
+    """Risultato con la stessa struttura di analysis.R: test per feature, coefs_lambda in formato lungo"""
+    rng = random.Random(42)
+    names = [f"feature_{i}" for i in range(features)]
+    t_test = [
+        {
+            "Variable": name,
+            "statistic": rng.gauss(0, 2),
+            "pValue": rng.random(),
+            "fdr": rng.random(),
+            "mean_group1": rng.gauss(10, 1),
+            "mean_group2": rng.gauss(10, 1)
+        }
+        for name in names
+    ]
+    coefs_lambda = [
+        {"feature": name, "lambda": 10 ** (-3 + 5 * j / lambdas), "coefficient": rng.gauss(0, 0.1)}
+        for name in names[:max(1, features // 10)]
+        for j in range(lambdas)
+    ]
+    importance = [{"Variable": name, "importance": rng.random() * 100} for name in names]
+    return {
+        "status": "completed",
+        "results": {
+            "student-t": {"testName": "Student T-Test", "data": t_test},
+            "ridge": {"testName": "Ridge Regression", "coefs_lambda": coefs_lambda, "lambda_min": 0.01},
+            "randomForest": {"testName": "Random Forest", "importance": importance}
+        }
+    }
+
+
+def timed(func, repeat: int):
+    best = None
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+def before(results: dict) -> bytes:
+    model = AnalysisResult(id="bench", status="completed", results=results, timestamp=datetime.now())
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def after(results: dict) -> bytes:
+    return FastJSONResponse({
+        "id": "bench",
+        "status": "completed",
+        "results": results,
+        "error": None,
+        "timestamp": datetime.now(),
+        "queue_position": None
+    }).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=20000)
+    parser.add_argument("--lambdas", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = synthetic_results(args.features, args.lambdas)
+    print(f"Synthetic result: {args.features} features, {args.lambdas} lambdas")
+    print(f"JSON backend: {'orjson' if fastapi_main.orjson is not None else 'json (orjson not installed)'}")
+    print()
+
+    before_time, before_body = timed(lambda: before(results), args.repeat)
+    after_time, after_body = timed(lambda: after(results), args.repeat)
+    print(f"{'step':<44}{'time (ms)':>12}{'bytes':>14}")
+    print(f"{'before: AnalysisResult + jsonable_encoder':<44}{before_time * 1000:>12.1f}{len(before_body):>14,}")
+    print(f"{'after:  FastJSONResponse':<44}{after_time * 1000:>12.1f}{len(after_body):>14,}")
+
+    encoders = [("gzip", GzipCompressor)]
+    if fastapi_main.brotli is not None:
+        encoders.append(("br", BrotliCompressor))
+    for name, compressor in encoders:
+        compress_time, compressed = timed(lambda: compressor().compress(after_body, final=True), args.repeat)
+        label = f"after + {name} (on the wire)"
+        print(f"{label:<44}{(after_time + compress_time) * 1000:>12.1f}{len(compressed):>14,}")
+    if fastapi_main.brotli is None:
+        print("(brotli not installed: br skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from pydantic import BaseModel, Field, field_validator, ValidationError
 import subprocess
 import json
@@ -11,13 +12,44 @@ import shutil
 import sys
 import logging
 import platform
+import signal
 import asyncio
+import itertools
+import threading
+import contextlib
+import hashlib
+import heapq
+import time
+import math
+import sqlite3
+import zlib
 import traceback
 from typing import Optional, Dict, Any, List, Literal
+from collections import OrderedDict
 from datetime import datetime
-from enum import Enum
+from pathlib import Path
+from enum import Enum, IntEnum
 import aiofiles
 
+# pyarrow è opzionale: senza, analysis.R restituisce le tabelle dei risultati inline come JSON
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# orjson e brotli sono opzionali: senza, le risposte usano json standard e solo gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Compatibilità Windows per asyncio, roba per compatibilità con Windows in locale
 if platform.system() == "Windows":
     # Imposta la policy del loop di eventi per evitare problemi subprocess su Windows
@@ -33,12 +65,207 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class FastJSONResponse(JSONResponse):
+    """JSON serializzato direttamente (orjson se installato), senza passare da jsonable_encoder.
+    
+    Usata dagli endpoint che restituiscono payload grandi (risultati, sessioni, liste).
+    """
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content, default=json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+# Compressione delle risposte negoziata con Accept-Encoding
+COMPRESSION_MIN_BYTES = int(os.environ.get("OMICS_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("OMICS_GZIP_LEVEL", "3"))  # oltre 3 guadagna poco e costa il doppio sui MB di risultati
+BROTLI_QUALITY = int(os.environ.get("OMICS_BROTLI_QUALITY", "4"))
+
+class GzipCompressor:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class BrotliCompressor:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (self._compressor.finish() if final else self._compressor.flush())
+
+RESPONSE_COMPRESSORS = {"br": BrotliCompressor, "gzip": GzipCompressor}
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """br se il client lo accetta e brotli è installato, altrimenti gzip, altrimenti nessuna compressione"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if "br" in accepted and brotli is not None:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    """Middleware ASGI che comprime le risposte 200 più grandi di minimum_size.
+    
+    Le risposte a blocchi (file, stream) sono compresse un blocco alla volta, con flush dopo ogni
+    blocco; gli eventi SSE non vengono compressi per non ritardarne la consegna.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if (
+                    start_message["status"] != 200
+                    or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith("text/event-stream")
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                
+                compressor = RESPONSE_COMPRESSORS[encoding]()
+                body = compressor.compress(body, final=not more_body)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body
+            })
+        
+        await self.app(scope, receive, send_compressed)
+
+# Upload: dimensione massima del file e blocchi con cui è copiato nel blob store
+MAX_UPLOAD_MB = int(os.environ.get("OMICS_MAX_UPLOAD_MB", "2048"))
+UPLOAD_CHUNK_KB = int(os.environ.get("OMICS_UPLOAD_CHUNK_KB", "1024"))
+UPLOAD_PATHS = ("/preprocess", "/analyze")
+UPLOAD_FORM_OVERHEAD_BYTES = 1024 * 1024  # campi del form (opzioni JSON) e boundary multipart oltre al file
+
+class UploadTooLarge(Exception):
+    """L'upload supera la dimensione massima consentita"""
+
+class UploadLimitMiddleware:
+    """Middleware ASGI che rifiuta con 413 i body troppo grandi sui percorsi di upload.
+    
+    Starlette salva tutto il multipart in file temporanei prima di chiamare l'endpoint, quindi il limite
+    va applicato qui: subito sul Content-Length dichiarato, oppure contando i byte ricevuti (upload
+    chunked), interrompendo la lettura appena il limite è superato.
+    """
+
+    def __init__(self, app, max_bytes: int, paths=UPLOAD_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def _reject(self, send):
+        body = json.dumps({
+            "detail": f"File too large: maximum upload size is {MAX_UPLOAD_MB} MB"
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+        
+        received = 0
+        exceeded = False
+        response_started = False
+        
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(f"Request body exceeds {self.max_bytes} bytes")
+            return message
+        
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded and not response_started:
+                return  # la risposta d'errore del parser del form è sostituita dal 413
+            response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            if response_started:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send)
+
 app = FastAPI(
     title="Omics Analysis Dashboard API",
     description="FastAPI backend per l'analisi di dati omici con R",
     version="1.0.0"
 )
 
+# Limite sugli upload (dentro CORS, così anche i 413 hanno gli header CORS)
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_MB * 1024 * 1024 + UPLOAD_FORM_OVERHEAD_BYTES)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -46,10 +273,333 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count"],
 )
+app.add_middleware(CompressionMiddleware)
+
+USER_SESSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_sessions")
+
+# Stato delle analisi: "sqlite" è condiviso da tutti i worker uvicorn, "memory" vale per un solo processo
+STATE_BACKEND = os.environ.get("OMICS_STATE_BACKEND", "sqlite")
+ACTIVE_STATUSES = ("pending", "running")
+FINISHED_STATUSES = ("completed", "error", "cancelled")
+# Identifica il processo che ha accettato un'analisi (le esegue solo lui). Il suffisso casuale lo rende
+# unico anche quando un container riavviato riusa hostname e PID
+PROCESS_OWNER = f"{platform.node()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Lease dei processi: ognuno rinnova il proprio heartbeat_at; le analisi attive di un owner senza
+# rinnovo da più di ANALYSIS_LEASE_SECONDS sono orfane (processo o container terminato)
+ANALYSIS_LEASE_SECONDS = float(os.environ.get("OMICS_ANALYSIS_LEASE_SECONDS", "60"))
+LEASE_RENEW_SECONDS = ANALYSIS_LEASE_SECONDS / 4
+
+class MemoryStateStore:
+    """Record di stato delle analisi nel processo corrente (un solo worker uvicorn)"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()  # chiamato da asyncio.to_thread: i cambi condizionati restano atomici
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(analysis_id)
+            return dict(record) if record is not None else None
+
+    def __contains__(self, analysis_id: str) -> bool:
+        return analysis_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def items(self) -> List[tuple]:
+        with self._lock:
+            return [(analysis_id, dict(record)) for analysis_id, record in self._records.items()]
+
+    def put(self, record: Dict[str, Any], if_not_active: bool = False) -> Optional[Dict[str, Any]]:
+        """Registra un record (versione = precedente + 1); None se if_not_active e l'analisi è in corso"""
+        with self._lock:
+            previous = self._records.get(record["id"])
+            if if_not_active and previous is not None and previous["status"] in ACTIVE_STATUSES:
+                return None
+            record = dict(record, version=(previous or {}).get("version", 0) + 1)
+            self._records[record["id"]] = record
+            return dict(record)
+
+    def update(self, analysis_id: str, fields: Dict[str, Any], expected_status: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        """Applica fields se il record esiste (e ha uno degli stati attesi); restituisce il record nuovo"""
+        with self._lock:
+            record = self._records.get(analysis_id)
+            if record is None or (expected_status and record["status"] not in expected_status):
+                return None
+            record.update(fields)
+            record["version"] = record.get("version", 0) + 1
+            record["timestamp"] = datetime.now()
+            return dict(record)
+
+    def delete(self, analysis_id: str) -> None:
+        with self._lock:
+            self._records.pop(analysis_id, None)
+
+    def trim_finished(self, max_finished: int) -> List[str]:
+        with self._lock:
+            finished = sorted(
+                (record["timestamp"], analysis_id) for analysis_id, record in self._records.items()
+                if record["status"] in FINISHED_STATUSES
+            )
+            removed = [analysis_id for _, analysis_id in finished[:max(0, len(finished) - max_finished)]]
+            for analysis_id in removed:
+                del self._records[analysis_id]
+            return removed
+
+    def renew_lease(self, owner: str) -> None:
+        pass
+
+    def fail_orphaned(self, lease_seconds: float) -> int:
+        return 0
+
+class SQLiteStateStore:
+    """Record di stato delle analisi in SQLite (user_sessions/.analysis_state.sqlite).
+    
+    Tutti i worker uvicorn leggono e scrivono lo stesso file; ogni modifica è una transazione
+    (BEGIN IMMEDIATE), quindi i cambi di stato condizionati (expected_status, if_not_active)
+    sono atomici anche tra processi diversi.
+    """
+
+    DATETIME_FIELDS = ("timestamp", "created_at", "started_at", "finished_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # una connessione per thread (loop e thread di to_thread)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                "version INTEGER NOT NULL, timestamp TEXT NOT NULL, record TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_status ON analyses (status, timestamp)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (owner TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _decode(self, encoded: str) -> Dict[str, Any]:
+        record = json.loads(encoded)
+        for field in self.DATETIME_FIELDS:
+            if isinstance(record.get(field), str):
+                record[field] = datetime.fromisoformat(record[field])
+        return record
+
+    def _write(self, conn: sqlite3.Connection, record: Dict[str, Any]) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+            (record["id"], record["status"], record["version"], record["timestamp"].isoformat(),
+             json.dumps(record, default=json_default))
+        )
+
+    def _read(self, conn: sqlite3.Connection, analysis_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT record FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return self._read(self._connection(), analysis_id)
+
+    def __contains__(self, analysis_id: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM analyses WHERE id = ?", (analysis_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def items(self) -> List[tuple]:
+        rows = self._connection().execute("SELECT id, record FROM analyses").fetchall()
+        return [(analysis_id, self._decode(record)) for analysis_id, record in rows]
+
+    def put(self, record: Dict[str, Any], if_not_active: bool = False) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            previous = self._read(conn, record["id"])
+            if if_not_active and previous is not None and previous["status"] in ACTIVE_STATUSES:
+                return None
+            record = dict(record, version=(previous or {}).get("version", 0) + 1)
+            self._write(conn, record)
+        return record
+
+    def update(self, analysis_id: str, fields: Dict[str, Any], expected_status: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            record = self._read(conn, analysis_id)
+            if record is None or (expected_status and record["status"] not in expected_status):
+                return None
+            record.update(fields)
+            record["version"] = record.get("version", 0) + 1
+            record["timestamp"] = datetime.now()
+            self._write(conn, record)
+        return record
+
+    def delete(self, analysis_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+
+    def trim_finished(self, max_finished: int) -> List[str]:
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT id FROM analyses WHERE status IN ({placeholders}) ORDER BY timestamp DESC LIMIT -1 OFFSET ?",
+                (*FINISHED_STATUSES, max_finished)
+            ).fetchall()
+            conn.executemany("DELETE FROM analyses WHERE id = ?", rows)
+        return [row[0] for row in rows]
+
+    def renew_lease(self, owner: str) -> None:
+        """Rinnova il lease del processo owner (heartbeat_at = ora)"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO leases VALUES (?, ?) ON CONFLICT (owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (owner, time.time())
+            )
+
+    def fail_orphaned(self, lease_seconds: float) -> int:
+        """Chiude le analisi pending/running il cui owner non rinnova il lease da più di lease_seconds
+        (processo terminato, container ricreato o riavviato)"""
+        failed = 0
+        cutoff = time.time() - lease_seconds
+        with self._transaction() as conn:
+            live_owners = {
+                row[0] for row in conn.execute("SELECT owner FROM leases WHERE heartbeat_at >= ?", (cutoff,))
+            }
+            rows = conn.execute("SELECT record FROM analyses WHERE status IN (?, ?)", ACTIVE_STATUSES).fetchall()
+            for (encoded,) in rows:
+                record = self._decode(encoded)
+                if record.get("owner") in live_owners:
+                    continue
+                now = datetime.now()
+                record.update(
+                    status="error",
+                    error="Analysis interrupted: the server process running it stopped",
+                    version=record.get("version", 0) + 1,
+                    timestamp=now,
+                    finished_at=now
+                )
+                self._write(conn, record)
+                failed += 1
+            conn.execute("DELETE FROM leases WHERE heartbeat_at < ?", (cutoff,))
+        return failed
+
+def create_state_store():
+    if STATE_BACKEND == "memory":
+        return MemoryStateStore()
+    if STATE_BACKEND != "sqlite":
+        logger.warning(f"Unknown OMICS_STATE_BACKEND={STATE_BACKEND}, using sqlite")
+    return SQLiteStateStore(os.path.join(USER_SESSIONS_DIR, ".analysis_state.sqlite"))
+
+# Storage globale: solo i record di stato (leggeri); i risultati stanno in result_bodies
+analysis_storage = create_state_store()
+
+async def maintain_analysis_leases():
+    """Rinnova il lease di questo processo e chiude le analisi dei processi che hanno smesso di rinnovarlo"""
+    while True:
+        try:
+            await asyncio.to_thread(analysis_storage.renew_lease, PROCESS_OWNER)
+            failed = await asyncio.to_thread(analysis_storage.fail_orphaned, ANALYSIS_LEASE_SECONDS)
+            if failed:
+                logger.warning(f"Marked {failed} analyses of stopped server processes as failed")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to renew analysis lease: {e}")
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+
+lease_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_analysis_leases():
+    global lease_task
+    # Il primo rinnovo avviene prima di accettare richieste: le analisi di questo processo hanno sempre un lease
+    await asyncio.to_thread(analysis_storage.renew_lease, PROCESS_OWNER)
+    lease_task = asyncio.create_task(maintain_analysis_leases())
+
+@app.on_event("shutdown")
+async def stop_analysis_leases():
+    if lease_task is not None:
+        lease_task.cancel()
+
+# Analisi concluse tenute in memoria: le più vecchie si possono ricostruire dal disco
+ANALYSIS_STORAGE_MAX_FINISHED = int(os.environ.get("OMICS_ANALYSIS_STORAGE_MAX_FINISHED", "1000"))
+RESULT_MEMORY_MB = int(os.environ.get("OMICS_RESULT_MEMORY_MB", "512"))
+
+class ResultBodyCache:
+    """LRU dei risultati delle analisi in memoria, limitata dalla dimensione stimata.
+    
+    La dimensione di un risultato è quella del suo analysis_results.json: una stima, ma dello
+    stesso ordine di grandezza degli oggetti Python (le tabelle Arrow restano su disco).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()  # usata anche dai thread di asyncio.to_thread
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-# Storage globale (temporaneo?)
-analysis_storage: Dict[str, Dict[str, Any]] = {}
+    def get(self, analysis_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(analysis_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, analysis_id: str, results: Any, size: int) -> None:
+        with self._lock:
+            self._discard(analysis_id)
+            # Un risultato più grande dell'intera cache viene servito ma non tenuto
+            if size > self.max_bytes:
+                return
+            self._entries[analysis_id] = (results, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def discard(self, analysis_id: str) -> None:
+        with self._lock:
+            self._discard(analysis_id)
+
+    def _discard(self, analysis_id: str) -> None:
+        entry = self._entries.pop(analysis_id, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+result_bodies = ResultBodyCache(RESULT_MEMORY_MB * 1024 * 1024)
+
+# Richieste di /status in long-poll che aspettano una nuova versione dell'analisi (loop, evento)
+analysis_waiters: Dict[str, tuple] = {}
 
 # Modelli Pydantic per controllo dell'input
 class AnalysisStatus(BaseModel):
@@ -61,6 +611,21 @@ class AnalysisResult(BaseModel):
     results: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     timestamp: datetime
+    queue_position: Optional[int] = None
+
+class AnalysisStatusResponse(BaseModel):
+    """Stato di un'analisi senza i risultati (quelli sono solo su /results)"""
+    id: str
+    status: str
+    version: int
+    error: Optional[str] = None
+    queue_position: Optional[int] = None
+    progress: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    timestamp: datetime
+    has_results: bool = False
 
 class PreprocessingResult(BaseModel):
     success: bool
@@ -330,6 +895,8 @@ def create_temp_directory() -> str:
     """Crea una directory temporanea per l'elaborazione dei file"""
     return tempfile.mkdtemp()
 
+SESSION_INFO_FILE = "session_info.json"
+
 def create_user_session_directory(user_id: str, session_id: str) -> str:
     """Crea una directory persistente per i dati della sessione utente"""
     # Crea il nome della directory combinando userId e sessionId
@@ -342,8 +909,179 @@ def create_user_session_directory(user_id: str, session_id: str) -> str:
     # Crea la directory se non esiste
     os.makedirs(session_dir, exist_ok=True)
     
+    # Data di creazione della sessione: i file caricati sono hardlink a blob condivisi, il loro ctime
+    # cambia ogni volta che un'altra sessione collega lo stesso contenuto
+    info_path = os.path.join(session_dir, SESSION_INFO_FILE)
+    if not os.path.exists(info_path):
+        try:
+            with open(info_path, 'x', encoding='utf-8') as f:
+                json.dump({"created_at": datetime.now().isoformat()}, f)
+        except FileExistsError:
+            pass
+    
     return session_dir
 
+def session_created_date(session_path: str) -> datetime:
+    """Data di creazione di una sessione, da session_info.json.
+
+    Per le sessioni create prima di session_info.json usa il timestamp più vecchio tra la cartella e
+    i suoi file non condivisi (un solo link), mai quelli dei blob condivisi.
+    """
+    try:
+        with open(os.path.join(session_path, SESSION_INFO_FILE), 'r', encoding='utf-8') as f:
+            return datetime.fromisoformat(json.load(f)["created_at"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    timestamps = [os.stat(session_path).st_mtime]
+    for entry in os.scandir(session_path):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if entry.is_file() and stat.st_nlink <= 1:
+            timestamps.append(stat.st_mtime)
+    return datetime.fromtimestamp(min(timestamps))
+
+def list_session_folders(user_sessions_dir: str) -> List[str]:
+    """Nomi delle cartelle di sessione, escluse quelle interne del backend (es. .result_cache)"""
+    return [name for name in os.listdir(user_sessions_dir) if not name.startswith(".")]
+
+def find_analysis_session_dir(analysis_id: str) -> str:
+    """Cartella di sessione di un'analisi, senza crearla"""
+    if "_" in analysis_id:
+        user_id, session_id = analysis_id.split("_", 1)
+    else:
+        # For plain UUIDs, assume it's a session ID and try to find the corresponding user session
+        session_id = analysis_id
+        try:
+            session_folder = session_index.find_folder(session_id)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Session index lookup failed for {session_id}: {e}")
+            session_folder = None
+        if session_folder:
+            return os.path.join(USER_SESSIONS_DIR, session_folder)
+        
+        # If not found, default to MasterTest for backward compatibility
+        user_id = "MasterTest"
+    
+    return os.path.join(USER_SESSIONS_DIR, f"{user_id}_{session_id}")
+
+# Ogni modifica allo stato di un'analisi passa da qui: la versione cambia e i long-poll si svegliano
+def notify_analysis_change(analysis_id: str):
+    entry = analysis_waiters.pop(analysis_id, None)
+    if entry is not None:
+        loop, waiter = entry
+        # Le scritture sullo stato girano in asyncio.to_thread: l'evento va impostato nel suo loop
+        try:
+            loop.call_soon_threadsafe(waiter.set)
+        except RuntimeError:
+            pass  # loop già chiuso (arresto del server)
+
+def result_body_size(record: Dict[str, Any]) -> int:
+    try:
+        return os.path.getsize(record["results_file"])
+    except (KeyError, OSError):
+        return 1024 * 1024
+
+def keep_result_body(record: Dict[str, Any], results: Any) -> None:
+    if results is not None:
+        result_bodies.put(record["id"], results, result_body_size(record))
+
+def trim_analysis_storage() -> None:
+    """Toglie dallo storage i record delle analisi concluse meno recenti oltre il limite"""
+    for analysis_id in analysis_storage.trim_finished(ANALYSIS_STORAGE_MAX_FINISHED):
+        result_bodies.discard(analysis_id)
+
+def store_analysis(analysis_id: str, if_not_active: bool = False, **fields) -> Optional[Dict[str, Any]]:
+    """Registra (o sostituisce) lo stato di un'analisi; results va nella cache dei risultati.
+    
+    Con if_not_active non sostituisce un'analisi pending/running e restituisce None.
+    """
+    results = fields.pop("results", None)
+    now = datetime.now()
+    record = {
+        "id": analysis_id,
+        "error": None,
+        "timestamp": now,
+        "created_at": now
+    }
+    record.update(fields)
+    # La versione continua da quella precedente: un ETag vecchio non torna mai valido
+    record = analysis_storage.put(record, if_not_active=if_not_active)
+    if record is None:
+        return None
+    result_bodies.discard(analysis_id)
+    keep_result_body(record, results)
+    notify_analysis_change(analysis_id)
+    trim_analysis_storage()
+    return record
+
+def update_analysis(analysis_id: str, expected_status: Optional[tuple] = None, **fields) -> Optional[Dict[str, Any]]:
+    """Aggiorna i campi dello stato di un'analisi e ne incrementa la versione.
+    
+    Con expected_status l'aggiornamento avviene solo se l'analisi è in uno di quegli stati
+    (altrimenti restituisce None), in modo atomico rispetto agli altri worker.
+    """
+    results = fields.pop("results", None)
+    record = analysis_storage.update(analysis_id, fields, expected_status)
+    if record is None:
+        return None
+    keep_result_body(record, results)
+    notify_analysis_change(analysis_id)
+    if record["status"] in FINISHED_STATUSES:
+        trim_analysis_storage()
+    return record
+
+def remove_analysis(analysis_id: str):
+    analysis_storage.delete(analysis_id)
+    result_bodies.discard(analysis_id)
+    notify_analysis_change(analysis_id)
+
+async def wait_for_analysis_change(analysis_id: str, timeout: float):
+    """Attende al massimo timeout secondi la prossima modifica dell'analisi"""
+    _, waiter = analysis_waiters.setdefault(analysis_id, (asyncio.get_running_loop(), asyncio.Event()))
+    try:
+        await asyncio.wait_for(waiter.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+def find_analysis(analysis_id: str) -> Optional[Dict[str, Any]]:
+    """Stato di un'analisi dallo store, o ricostruito dal disco se completata e non più nello store.
+
+    Legge e scrive lo store SQLite (con attese sul lock di scrittura): dal codice async va chiamata
+    con asyncio.to_thread, come store_analysis/update_analysis/remove_analysis.
+    """
+    return analysis_storage.get(analysis_id) or restore_analysis_from_disk(analysis_id)
+
+def restore_analysis_from_disk(analysis_id: str) -> Optional[Dict[str, Any]]:
+    """Ricostruisce lo stato di un'analisi completata da analysis_results.json, senza leggerlo"""
+    session_dir = find_analysis_session_dir(analysis_id)
+    results_file = os.path.join(session_dir, "analysis_results.json")
+    if not os.path.exists(results_file):
+        return None
+    
+    logger.info(f"Restoring analysis {analysis_id} from: {results_file}")
+    finished_at = datetime.fromtimestamp(os.path.getmtime(results_file))
+    return store_analysis(
+        analysis_id,
+        status="completed",
+        session_dir=session_dir,
+        results_file=results_file,
+        finished_at=finished_at
+    )
+
+def load_analysis_results(analysis_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Risultati dell'analisi: dalla cache in memoria, altrimenti riletti da results_file"""
+    results = result_bodies.get(analysis_data["id"])
+    if results is None and analysis_data.get("results_file"):
+        with open(analysis_data["results_file"], 'r') as f:
+            results = json.load(f)
+        keep_result_body(analysis_data, results)
+    return results
+
+def analysis_has_results(analysis_data: Dict[str, Any]) -> bool:
+    return bool(analysis_data.get("results_file"))
+
 def cleanup_temp_directory(temp_dir: str):
     """Pulisce la directory temporanea"""
     try:
@@ -371,7 +1109,402 @@ def save_session_options(session_dir: str, preprocessing_options: dict, analysis
         logger.error(f"Failed to save session options: {e}")
         raise Exception(f"Failed to save session options: {e}")
 
-async def run_r_script(script_name: str, args: Dict[str, Any], timeout: int = 1800) -> Dict[str, Any]:
+# Pool di worker R persistenti (r_worker.R): evita di ricaricare tutti i pacchetti R ad ogni job
+R_WORKER_POOL_SIZE = int(os.environ.get("OMICS_R_WORKERS", "2"))  # 0 disabilita il pool
+R_WORKER_MAX_JOBS = int(os.environ.get("OMICS_R_WORKER_MAX_JOBS", "25"))  # riavvio dopo N job
+R_WORKER_STARTUP_TIMEOUT = int(os.environ.get("OMICS_R_WORKER_STARTUP_TIMEOUT", "300"))
+R_WORKER_SCRIPTS = {"preprocess.R", "analysis.R"}
+# Ogni quanto un job in attesa di un worker libero ricontrolla che ne esista ancora almeno uno vivo
+R_WORKER_WAIT_CHECK_SECONDS = 5
+R_WORKER_RESPAWN_MAX_BACKOFF = 300  # attesa massima tra due tentativi di riavvio di un worker
+
+def kill_process_tree(proc) -> None:
+    """Termina un processo R e tutti i suoi figli"""
+    if proc.returncode is not None:
+        return
+    try:
+        if platform.system() == "Windows":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            # I processi R sono avviati in una nuova sessione: il process group ha lo stesso id del pid
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to kill R process tree {proc.pid}: {e}")
+
+class RWorker:
+    """Processo Rscript persistente che esegue i job di r_worker.R uno alla volta"""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.proc = None
+        self.jobs_done = 0
+        self._stderr_chunks: List[str] = []
+        self._stderr_task = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        self.proc = await asyncio.create_subprocess_exec(
+            "Rscript", os.path.join(project_dir, "r_worker.R"),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=project_dir,
+            start_new_session=True
+        )
+        # Svuota stderr in continuo, altrimenti il pipe si riempie e R si blocca
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+        message = await asyncio.wait_for(self._read_message(), timeout=R_WORKER_STARTUP_TIMEOUT)
+        if not message.get("ready"):
+            raise RuntimeError(f"R worker {self.worker_id} did not report ready: {message}")
+        logger.info(f"R worker {self.worker_id} ready (pid {self.proc.pid})")
+
+    async def _drain_stderr(self):
+        while True:
+            line = await self.proc.stderr.readline()
+            if not line:
+                break
+            self._stderr_chunks.append(line.decode('utf-8', errors='replace'))
+
+    async def _read_message(self) -> Dict[str, Any]:
+        """Legge la prossima riga JSON del worker, ignorando eventuale output non JSON dei pacchetti R"""
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError(f"R worker {self.worker_id} exited unexpectedly")
+            try:
+                message = json.loads(line.decode('utf-8', errors='replace'))
+            except json.JSONDecodeError:
+                continue
+            if isinstance(message, dict):
+                return message
+
+    async def run_job(self, script_name: str, args_file: str, timeout: int):
+        """Esegue un job e restituisce (stdout_text, stderr_text, returncode) come un Rscript one-shot"""
+        job_id = uuid.uuid4().hex
+        output_file = f"{args_file}.out.json"
+        self._stderr_chunks = []
+        request = {"job_id": job_id, "script": script_name, "args_file": args_file, "output_file": output_file}
+        try:
+            self.proc.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+            await self.proc.stdin.drain()
+
+            while True:
+                message = await asyncio.wait_for(self._read_message(), timeout=timeout)
+                if message.get("job_id") == job_id:
+                    break
+            self.jobs_done += 1
+            stderr_text = "".join(self._stderr_chunks)
+
+            if message.get("status") != "ok":
+                return "", f"{stderr_text}{message.get('error', 'Unknown R worker error')}", 1
+
+            async with aiofiles.open(output_file, 'r', encoding='utf-8', errors='replace') as f:
+                stdout_text = await f.read()
+            return stdout_text, stderr_text, 0
+        finally:
+            if os.path.exists(output_file):
+                try:
+                    os.unlink(output_file)
+                except OSError:
+                    pass
+
+    async def stop(self):
+        if self.proc is None:
+            return
+        if self.alive:
+            try:
+                self.proc.stdin.close()
+                await asyncio.wait_for(self.proc.wait(), timeout=5)
+            except Exception:
+                kill_process_tree(self.proc)
+                await self.proc.wait()
+        if self._stderr_task:
+            self._stderr_task.cancel()
+
+class RWorkerPool:
+    """Pool di worker R caldi: i job vanno a un worker libero, che viene riciclato dopo N job o un crash"""
+
+    def __init__(self, size: int, max_jobs: int):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._next_worker_id = 0
+        self._live_workers = 0
+        self._closing = False
+
+    @property
+    def available(self) -> bool:
+        return self._live_workers > 0
+
+    @property
+    def has_idle_worker(self) -> bool:
+        return not self._idle.empty()
+
+    async def start(self):
+        results = await asyncio.gather(*(self._spawn() for _ in range(self.size)), return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning(f"{len(failures)} R workers failed to start: {failures[0]}")
+        logger.info(f"R worker pool started with {self._live_workers}/{self.size} workers")
+
+    async def _spawn(self):
+        self._next_worker_id += 1
+        worker = RWorker(self._next_worker_id)
+        try:
+            await worker.start()
+        except Exception:
+            await worker.stop()
+            raise
+        self._live_workers += 1
+        await self._idle.put(worker)
+
+    async def _replace(self, worker: RWorker):
+        """Ferma un worker e ne avvia un altro al suo posto (in background), riprovando con backoff"""
+        self._live_workers -= 1
+        await worker.stop()
+        delay = R_WORKER_WAIT_CHECK_SECONDS
+        while not self._closing:
+            try:
+                await self._spawn()
+                return
+            except Exception as e:
+                logger.error(f"Failed to restart R worker (retrying in {delay}s): {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, R_WORKER_RESPAWN_MAX_BACKOFF)
+
+    async def _acquire(self) -> Optional[RWorker]:
+        """Attende un worker libero; None se nel frattempo non ne resta nessuno vivo (es. crash non riavviati)"""
+        while True:
+            try:
+                return await asyncio.wait_for(self._idle.get(), R_WORKER_WAIT_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                if self._live_workers <= 0:
+                    return None
+
+    async def run(self, script_name: str, args_file: str, timeout: int) -> Optional[tuple]:
+        """(stdout, stderr, returncode) del job; None se non ci sono worker vivi e va usato Rscript"""
+        worker = await self._acquire()
+        if worker is None:
+            return None
+        healthy = False
+        try:
+            result = await worker.run_job(script_name, args_file, timeout)
+            healthy = worker.alive
+            return result
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # Job annullato o scaduto: R (e i figli di mclapply) vanno fermati subito
+            kill_process_tree(worker.proc)
+            raise
+        finally:
+            if healthy and worker.jobs_done < self.max_jobs:
+                self._idle.put_nowait(worker)
+            else:
+                # Crash, timeout o troppi job: sostituisci il worker
+                reason = "recycled" if healthy else "crashed or timed out"
+                logger.info(f"R worker {worker.worker_id} {reason} after {worker.jobs_done} jobs")
+                asyncio.create_task(self._replace(worker))
+
+    async def shutdown(self):
+        self._closing = True
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            await worker.stop()
+            self._live_workers -= 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "live_workers": self._live_workers,
+            "idle_workers": self._idle.qsize()
+        }
+
+r_worker_pool: Optional[RWorkerPool] = None
+
+@app.on_event("startup")
+async def start_r_worker_pool():
+    global r_worker_pool
+    # Su Windows si continua a usare Rscript one-shot (vedi run_r_script)
+    if R_WORKER_POOL_SIZE <= 0 or platform.system() == "Windows":
+        return
+    r_worker_pool = RWorkerPool(R_WORKER_POOL_SIZE, R_WORKER_MAX_JOBS)
+    await r_worker_pool.start()
+
+@app.on_event("shutdown")
+async def stop_r_worker_pool():
+    if r_worker_pool is not None:
+        await r_worker_pool.shutdown()
+
+# Scheduler dei job R: coda limitata, slot concorrenti configurabili e priorità
+ANALYSIS_SLOTS = int(os.environ.get("OMICS_ANALYSIS_SLOTS", "2"))
+# Slot in più riservati ai job interattivi (preprocessing): non restano in attesa dietro analisi di ore
+INTERACTIVE_SLOTS = int(os.environ.get("OMICS_INTERACTIVE_SLOTS", "1"))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get("OMICS_ANALYSIS_QUEUE_SIZE", "50"))
+# Core per analisi usati da analysis.R per eseguire i metodi in parallelo (default: CPU divise tra gli slot)
+ANALYSIS_METHOD_CORES = int(os.environ.get(
+    "OMICS_ANALYSIS_METHOD_CORES", str(max(1, (os.cpu_count() or 1) // max(1, ANALYSIS_SLOTS)))
+))
+# Limite complessivo di analysis.R (rete di sicurezza) e budget di tempo dei singoli metodi, applicati in R
+ANALYSIS_TIMEOUT_SECONDS = int(os.environ.get("OMICS_ANALYSIS_TIMEOUT_SECONDS", "3600"))
+# analysis.R limita ogni metodo al tempo rimasto prima di questa scadenza: i metodi in ritardo risultano
+# timed_out invece di far uccidere tutto il job; il margine serve a lettura dati e scrittura dei risultati
+ANALYSIS_FINALIZE_MARGIN_SECONDS = max(60, ANALYSIS_TIMEOUT_SECONDS // 10)
+ANALYSIS_METHODS_DEADLINE_SECONDS = max(1, ANALYSIS_TIMEOUT_SECONDS - ANALYSIS_FINALIZE_MARGIN_SECONDS)
+
+def parse_method_time_limits(default_seconds: str, overrides: str) -> Dict[str, float]:
+    """Budget in secondi per metodo: {"default": N, "boruta": M, ...} da "boruta=M,rfe=K" """
+    limits = {"default": float(default_seconds)}
+    for item in overrides.split(","):
+        if "=" not in item:
+            continue
+        method, seconds = item.split("=", 1)
+        try:
+            limits[method.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid method time limit: {item.strip()}")
+    return limits
+
+METHOD_TIME_LIMITS = parse_method_time_limits(
+    os.environ.get("OMICS_METHOD_TIME_LIMIT_SECONDS", "1800"),
+    os.environ.get("OMICS_METHOD_TIME_LIMITS", "")
+)
+
+class JobPriority(IntEnum):
+    """Priorità dei job (valore più basso = eseguito prima)"""
+    interactive = 0   # preprocessing, l'utente attende la risposta
+    analysis = 10     # analisi lunghe in background
+
+class SchedulerQueueFull(Exception):
+    """La coda del scheduler ha raggiunto la dimensione massima"""
+
+class JobScheduler:
+    """Esegue i job R con un numero limitato di slot concorrenti, in ordine di priorità e di arrivo.
+    
+    Gli slot normali prendono qualsiasi job (prima gli interattivi); gli interactive_slots prendono
+    solo job interattivi, così un preprocessing parte subito anche con tutti gli slot occupati da analisi.
+    """
+
+    def __init__(self, slots: int, max_queue: int, interactive_slots: int = 0):
+        self.slots = slots
+        self.interactive_slots = interactive_slots
+        self.max_queue = max_queue
+        self._heap: List[tuple] = []  # (chiave di priorità, job_id, job_factory, future)
+        self._queue_changed = asyncio.Event()
+        self._pending: Dict[str, tuple] = {}  # job_id -> (chiave di priorità, future)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelling: set = set()
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker_loop(False)) for _ in range(self.slots)]
+        self._workers += [asyncio.create_task(self._worker_loop(True)) for _ in range(self.interactive_slots)]
+        logger.info(
+            f"Job scheduler started with {self.slots} slots (+{self.interactive_slots} interactive), "
+            f"queue size {self.max_queue}"
+        )
+
+    async def shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+
+    def submit(self, job_id: str, priority: JobPriority, job_factory) -> asyncio.Future:
+        """Accoda un job; job_factory è una funzione senza argomenti che restituisce la coroutine da eseguire"""
+        if len(self._pending) >= self.max_queue:
+            raise SchedulerQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+        key = (int(priority), next(self._seq))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = (key, future)
+        heapq.heappush(self._heap, (key, job_id, job_factory, future))
+        self._queue_changed.set()
+        return future
+
+    def cancel(self, job_id: str) -> bool:
+        """Toglie il job dalla coda o interrompe quello in esecuzione; False se il job non è di questo processo"""
+        pending = self._pending.pop(job_id, None)
+        if pending is not None:
+            pending[1].cancel()  # la voce resta nella coda, il worker la salta
+            return True
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        self._cancelling.add(job_id)
+        task.cancel()
+        return True
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Posizione (1 = prossimo) del job in coda, None se non è in attesa"""
+        pending = self._pending.get(job_id)
+        if pending is None:
+            return None
+        return 1 + sum(1 for other, _ in self._pending.values() if other < pending[0])
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "interactive_slots": self.interactive_slots,
+            "running": len(self._running),
+            "queued": len(self._pending),
+            "max_queue": self.max_queue
+        }
+
+    def _take(self, interactive_only: bool) -> Optional[tuple]:
+        """Prossimo job eseguibile da uno slot (None se non ce n'è): gli interattivi sono in testa"""
+        while self._heap and self._heap[0][3].done():
+            heapq.heappop(self._heap)  # annullato mentre era in coda
+        if not self._heap or (interactive_only and self._heap[0][0][0] != JobPriority.interactive):
+            return None
+        return heapq.heappop(self._heap)
+
+    async def _next_job(self, interactive_only: bool) -> tuple:
+        while True:
+            job = self._take(interactive_only)
+            if job is not None:
+                return job
+            self._queue_changed.clear()
+            await self._queue_changed.wait()
+
+    async def _worker_loop(self, interactive_only: bool):
+        while True:
+            key, job_id, job_factory, future = await self._next_job(interactive_only)
+            if self._pending.get(job_id, (None,))[0] == key:
+                del self._pending[job_id]
+            if future.done():
+                continue
+            task = asyncio.create_task(job_factory())
+            self._running[job_id] = task
+            try:
+                result = await task
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                # Solo l'annullamento del job (cancel) non ferma lo slot
+                if job_id not in self._cancelling:
+                    raise
+                future.cancel()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelling.discard(job_id)
+
+job_scheduler = JobScheduler(ANALYSIS_SLOTS, ANALYSIS_QUEUE_SIZE, INTERACTIVE_SLOTS)
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    job_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_job_scheduler():
+    await job_scheduler.shutdown()
+
+async def run_r_script(script_name: str, args: Dict[str, Any], timeout: int = 1800, interactive: bool = False) -> Dict[str, Any]:
     """Esegue uno script R con argomenti dati e restituisce il risultato JSON parsato"""
     temp_file_path = None
     try:
@@ -402,35 +1535,65 @@ async def run_r_script(script_name: str, args: Dict[str, Any], timeout: int = 18
         
         # Esecuzione subprocess compatibile con Windows
         import platform
-        if platform.system() == "Windows":
+        # Un job interattivo non aspetta che un worker finisca un'analisi: senza worker liberi avvia Rscript
+        use_pool = r_worker_pool is not None and r_worker_pool.available and script_name in R_WORKER_SCRIPTS
+        if use_pool and interactive and not r_worker_pool.has_idle_worker:
+            logger.info(f"No idle R worker for interactive {script_name}, starting Rscript")
+            use_pool = False
+        pool_result = None
+        if use_pool:
+            # Worker R già caldo: niente avvio di Rscript né ricaricamento dei pacchetti
+            pool_result = await r_worker_pool.run(script_name, temp_file_path, timeout)
+            if pool_result is None:
+                logger.warning(f"No live R workers left, running {script_name} with Rscript")
+
+        if pool_result is not None:
+            stdout_text, stderr_text, returncode = pool_result
+
+        elif platform.system() == "Windows":
             # Usa subprocess.run con asyncio.to_thread per compatibilità Windows
             import subprocess
             from functools import partial
             
+            proc = subprocess.Popen(
+                ["Rscript", script_path, temp_file_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            
             def run_r_sync():
-                result = subprocess.run(
-                    ["Rscript", script_path, temp_file_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout
-                )
-                return result
+                try:
+                    return proc.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    kill_process_tree(proc)
+                    proc.communicate()
+                    raise asyncio.TimeoutError()
             
             # Esegui in thread per evitare il blocco
-            result = await asyncio.to_thread(run_r_sync)
-            stdout_text = result.stdout
-            stderr_text = result.stderr
-            returncode = result.returncode
+            try:
+                stdout_text, stderr_text = await asyncio.to_thread(run_r_sync)
+            except asyncio.CancelledError:
+                # Il thread resta in communicate() finché Rscript non termina
+                kill_process_tree(proc)
+                raise
+            returncode = proc.returncode
             
         else:
             # Sistemi Unix/Linux - usa subprocess asyncio
             proc = await asyncio.create_subprocess_exec(
                 "Rscript", script_path, temp_file_path,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True  # process group proprio: kill_process_tree raggiunge anche i figli
             )
             
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                kill_process_tree(proc)
+                await proc.wait()
+                raise
             
             # Decodifica l'output con gestione degli errori
             try:
@@ -515,10 +1678,732 @@ async def run_r_script(script_name: str, args: Dict[str, Any], timeout: int = 18
         # Pulisce il file temporaneo degli argomenti
         if temp_file_path and os.path.exists(temp_file_path):
             try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temp file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to cleanup temp args file: {e}")
+                os.unlink(temp_file_path)
+                logger.info(f"Cleaned up temp file: {temp_file_path}")
+            except Exception as e:
+                logger.warning(f"Failed to cleanup temp args file: {e}")
+
+# Cache su disco (risultati delle analisi, file preprocessati) sotto user_sessions/.<nome>_cache
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("OMICS_RESULT_CACHE_MAX_ENTRIES", "100"))
+RESULT_CACHE_MAX_MB = int(os.environ.get("OMICS_RESULT_CACHE_MAX_MB", "2048"))
+RESULT_CACHE_MAX_AGE_HOURS = float(os.environ.get("OMICS_RESULT_CACHE_MAX_AGE_HOURS", "168"))
+PREPROCESS_CACHE_MAX_MB = int(os.environ.get("OMICS_PREPROCESS_CACHE_MAX_MB", "4096"))
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash SHA-256 del contenuto di un file, letto a blocchi"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Versione degli script R: risultati in cache e checkpoint prodotti da un'altra versione non vengono riusati
+ANALYSIS_SCRIPT_HASH = file_sha256(os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis.R"))
+PREPROCESS_SCRIPT_HASH = file_sha256(os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocess.R"))
+
+# Trasporto dei risultati da R: "arrow" (tabelle su file Arrow IPC + manifest JSON) o "json" (tutto su stdout)
+RESULT_TRANSPORT = os.environ.get("OMICS_RESULT_TRANSPORT", "arrow" if pa is not None else "json")
+if RESULT_TRANSPORT == "arrow" and pa is None:
+    logger.warning("OMICS_RESULT_TRANSPORT=arrow requires pyarrow, falling back to json")
+    RESULT_TRANSPORT = "json"
+
+def options_fingerprint(options: Dict[str, Any]) -> str:
+    """Impronta stabile di un set di opzioni (ignora userId/sessionId, che cambiano a ogni sessione)"""
+    normalized = {key: value for key, value in options.items() if key not in ("userId", "sessionId")}
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hardlink di un file (nessuna scrittura dei dati), con copia se il filesystem non lo supporta"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def directory_size(path: str) -> int:
+    """Dimensione totale in byte dei file di una directory"""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class DiskCache:
+    """Cache su disco con una directory per voce (<cache_dir>/<chiave>) e un meta.json.
+
+    L'ultimo accesso è il mtime di meta.json: le voci più vecchie di max_age_seconds vengono
+    scartate, poi le meno usate finché numero di voci e dimensione totale rientrano nei limiti.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_entries: Optional[int] = None, max_age_seconds: float = 0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and (self.max_entries is None or self.max_entries > 0)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Directory della voce se presente e non scaduta (aggiorna l'ultimo accesso)"""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                created_at = json.load(f).get("created_at", 0)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.max_age_seconds > 0 and time.time() - created_at > self.max_age_seconds:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            self.misses += 1
+            return None
+        os.utime(meta_path)
+        self.hits += 1
+        return entry_dir
+
+    def _staging_dir(self, key: str) -> str:
+        staging_dir = f"{self._entry_dir(key)}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    def _commit(self, key: str, staging_dir: str) -> None:
+        """Rende visibile una voce preparata in staging_dir, poi applica l'eviction"""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(staging_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "created_at": time.time(), "size_bytes": directory_size(staging_dir)}, f)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(staging_dir, entry_dir)
+        except OSError as e:
+            logger.warning(f"Failed to store cache entry {key}: {e}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, "meta.json")
+            if name.endswith(".tmp") or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                meta["last_access"] = os.path.getmtime(meta_path)
+                meta["path"] = os.path.join(self.cache_dir, name)
+                entries.append(meta)
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def evict(self) -> None:
+        """Rimuove le voci scadute, poi le meno usate finché numero e dimensione rientrano nei limiti"""
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda entry: entry["last_access"])
+        kept = []
+        for entry in entries:
+            if self.max_age_seconds > 0 and now - entry.get("created_at", 0) > self.max_age_seconds:
+                shutil.rmtree(entry["path"], ignore_errors=True)
+            else:
+                kept.append(entry)
+
+        total_bytes = sum(entry.get("size_bytes", 0) for entry in kept)
+        while kept and ((self.max_entries is not None and len(kept) > self.max_entries) or total_bytes > self.max_bytes):
+            entry = kept.pop(0)
+            shutil.rmtree(entry["path"], ignore_errors=True)
+            total_bytes -= entry.get("size_bytes", 0)
+            logger.info(f"Evicted cache entry {entry.get('key')} from {self.cache_dir}")
+
+    def status(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "entries": len(entries),
+            "size_bytes": sum(entry.get("size_bytes", 0) for entry in entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class AnalysisResultCache(DiskCache):
+    """Risultati completi delle analisi: analysis_results.json più le eventuali result_tables Arrow"""
+
+    def key(self, file_hash: str, preprocessing_options: Dict[str, Any], analysis_options: Dict[str, Any]) -> str:
+        parts = [
+            file_hash,
+            options_fingerprint(preprocessing_options),
+            options_fingerprint(analysis_options),
+            ANALYSIS_SCRIPT_HASH,
+            RESULT_TRANSPORT
+        ]
+        return hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest()
+
+    def restore(self, key: str, session_dir: str, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Collega (hardlink) una voce nella sessione e restituisce il risultato, o None se assente/scaduta"""
+        entry_dir = self._lookup(key)
+        if entry_dir is None:
+            return None
+        try:
+            with open(os.path.join(entry_dir, "analysis_results.json"), 'r') as f:
+                result = json.load(f)
+            if isinstance(result, dict):
+                result["id"] = analysis_id
+
+            cached_tables = os.path.join(entry_dir, "result_tables")
+            if os.path.isdir(cached_tables):
+                session_tables = os.path.join(session_dir, "result_tables")
+                shutil.rmtree(session_tables, ignore_errors=True)
+                shutil.copytree(cached_tables, session_tables, copy_function=link_or_copy)
+
+            with open(os.path.join(session_dir, "analysis_results.json"), 'w') as f:
+                json.dump(result, f, separators=(",", ":"), default=str)
+            return result
+        except (OSError, ValueError) as e:
+            logger.warning(f"Result cache entry {key} unreadable, ignoring it: {e}")
+            return None
+
+    def put(self, key: str, session_dir: str, result: Dict[str, Any]) -> None:
+        """Salva il risultato di un'analisi completata"""
+        staging_dir = None
+        try:
+            staging_dir = self._staging_dir(key)
+            session_tables = os.path.join(session_dir, "result_tables")
+            if isinstance(result, dict) and result.get("result_transport") == "arrow" and os.path.isdir(session_tables):
+                shutil.copytree(session_tables, os.path.join(staging_dir, "result_tables"), copy_function=link_or_copy)
+            with open(os.path.join(staging_dir, "analysis_results.json"), 'w') as f:
+                json.dump(result, f, default=str)
+        except OSError as e:
+            logger.warning(f"Failed to store analysis result in cache: {e}")
+            if staging_dir:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        self._commit(key, staging_dir)
+        logger.info(f"Stored analysis result in cache: {key}")
+
+class PreprocessingCache(DiskCache):
+    """File preprocessati (processed_data.csv) per stesso contenuto, formato e opzioni di preprocessing"""
+
+    def key(self, file_hash: str, file_ext: str, preprocessing_options: Dict[str, Any]) -> str:
+        parts = [file_hash, file_ext.lower(), options_fingerprint(preprocessing_options), PREPROCESS_SCRIPT_HASH]
+        return hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest()
+
+    def restore(self, key: str, session_dir: str) -> Optional[str]:
+        """Collega il file preprocessato in cache nella sessione e ne restituisce il percorso"""
+        entry_dir = self._lookup(key)
+        if entry_dir is None:
+            return None
+        processed_file_path = os.path.join(session_dir, "processed_data.csv")
+        try:
+            if os.path.exists(processed_file_path):
+                os.unlink(processed_file_path)
+            link_or_copy(os.path.join(entry_dir, "processed_data.csv"), processed_file_path)
+            return processed_file_path
+        except OSError as e:
+            logger.warning(f"Preprocessing cache entry {key} unreadable, ignoring it: {e}")
+            return None
+
+    def put(self, key: str, processed_file_path: str) -> None:
+        """Salva il file prodotto da preprocess.R"""
+        staging_dir = None
+        try:
+            staging_dir = self._staging_dir(key)
+            link_or_copy(processed_file_path, os.path.join(staging_dir, "processed_data.csv"))
+        except OSError as e:
+            logger.warning(f"Failed to store preprocessed file in cache: {e}")
+            if staging_dir:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        self._commit(key, staging_dir)
+        logger.info(f"Stored preprocessed file in cache: {key}")
+
+# Il gc dei blob gira all'avvio di ogni worker uvicorn: file temporanei e blob senza link più recenti
+# di così possono essere un upload in corso o un blob appena salvato e non ancora collegato da un altro worker
+BLOB_GC_GRACE_SECONDS = 3600
+
+class BlobStore:
+    """Archivio content-addressed dei dataset: ogni contenuto è scritto una sola volta in
+    <root>/<aa>/<sha256> e le cartelle di sessione ne contengono degli hardlink.
+
+    I file collegati a un blob non vanno mai riscritti sul posto: chi li rigenera deve prima
+    rimuovere il link (os.unlink), altrimenti modificherebbe il blob condiviso.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _reuse(self, path: str) -> bool:
+        """True se il blob esiste già. Un blob senza altri link riceve un mtime nuovo, così il gc di un
+        altro worker non lo rimuove prima che venga collegato (con altri link il mtime è condiviso
+        con i file di sessione e resta invariato)"""
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _place(self, digest: str, write_tmp) -> str:
+        """Crea il blob se non esiste ancora, scrivendolo in un file temporaneo poi rinominato"""
+        path = self.blob_path(digest)
+        if self._reuse(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write_tmp(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return path
+
+    async def put_upload(self, upload: UploadFile, max_bytes: int, chunk_size: int) -> str:
+        """Copia nel blob store un upload (già salvato da Starlette in un file temporaneo) e ne restituisce l'hash SHA-256.
+
+        La copia avviene a blocchi, mai tutto in memoria, calcolando l'hash; oltre max_bytes solleva
+        UploadTooLarge. Il body della richiesta è già limitato da UploadLimitMiddleware.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"upload_{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = await upload.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(
+                            f"File too large: maximum upload size is {max_bytes // (1024 * 1024)} MB"
+                        )
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+            file_hash = digest.hexdigest()
+            path = self.blob_path(file_hash)
+            if not self._reuse(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            logger.info(f"Stored upload {upload.filename} ({size} bytes) as blob {file_hash}")
+            return file_hash
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def put_file(self, file_path: str) -> str:
+        """Deduplica un file già scritto (es. da R): diventa un link al blob con lo stesso contenuto"""
+        digest = file_sha256(file_path)
+        path = self.blob_path(digest)
+        if self._reuse(path):
+            if not os.path.samefile(path, file_path):
+                self.link(digest, file_path)
+        else:
+            self._place(digest, lambda tmp_path: link_or_copy(file_path, tmp_path))
+        return digest
+
+    def link(self, digest: str, dst: str) -> str:
+        """Collega il blob nel percorso di sessione dst (sostituendo un file esistente)"""
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        link_or_copy(self.blob_path(digest), dst)
+        return dst
+
+    def gc(self, grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> int:
+        """Rimuove i blob non più collegati ad alcuna sessione (un solo link = solo il blob) e i file
+        temporanei abbandonati, se non modificati da almeno grace_seconds"""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        cutoff = time.time() - grace_seconds
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff and (name.endswith(".tmp") or stat.st_nlink <= 1):
+                        os.unlink(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def status(self) -> Dict[str, Any]:
+        blobs = 0
+        size_bytes = 0
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                try:
+                    size_bytes += os.path.getsize(os.path.join(dirpath, name))
+                    blobs += 1
+                except OSError:
+                    continue
+        return {"blobs": blobs, "size_bytes": size_bytes}
+
+blob_store = BlobStore(os.path.join(USER_SESSIONS_DIR, ".blobs"))
+
+@app.on_event("startup")
+async def collect_unreferenced_blobs():
+    removed = await asyncio.to_thread(blob_store.gc)
+    if removed:
+        logger.info(f"Removed {removed} unreferenced blobs from {blob_store.root}")
+
+result_cache = AnalysisResultCache(
+    os.path.join(USER_SESSIONS_DIR, ".result_cache"),
+    RESULT_CACHE_MAX_MB * 1024 * 1024,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_age_seconds=RESULT_CACHE_MAX_AGE_HOURS * 3600
+)
+
+preprocessing_cache = PreprocessingCache(
+    os.path.join(USER_SESSIONS_DIR, ".preprocess_cache"),
+    PREPROCESS_CACHE_MAX_MB * 1024 * 1024
+)
+
+def describe_session_folder(session_path: str) -> Optional[Dict[str, Any]]:
+    """Voce di /analyses per una cartella di sessione, o None se non contiene un dataset caricato"""
+    session_folder = os.path.basename(session_path)
+    # Controlla se questa sessione ha dati di analisi
+    original_file_path = None
+    processed_file_path = None
+    results_file_path = None
+    
+    # Cerca i file chiave nella sessione
+    for file in os.listdir(session_path):
+        if file.startswith("original_"):
+            original_file_path = os.path.join(session_path, file)
+        elif file == "processed_data.csv":
+            processed_file_path = os.path.join(session_path, file)
+        elif file in ["analysis_results.json", "complete_results.json", "results.json"]:
+            results_file_path = os.path.join(session_path, file)
+            # Controlla anche eventuali file CSV di analisi processata che indicano completamento
+        elif file.startswith("analysis_processed_") and file.endswith(".csv"):
+            # Questo indica che l'analisi è stata completata e processata
+            if not results_file_path:  # Imposta solo se non abbiamo un file di risultati JSON
+                results_file_path = os.path.join(session_path, file)
+    
+    if not original_file_path:  # Include solo sessioni con dati
+        return None
+    
+    # Estrae il nome del dataset dal file originale
+    dataset_name = os.path.basename(original_file_path).replace("original_", "")
+    
+    # Determina lo status dell'analisi
+    status = "pending"
+    analysis_type = "Unknown"
+    description = None
+    completed_date = None
+    
+    if results_file_path and os.path.exists(results_file_path):
+        status = "completed"
+        # Try to read analysis type from results
+        try:
+            if results_file_path.endswith('.json'):
+                with open(results_file_path, 'r') as f:
+                    results_data = json.load(f)
+                    # Check if this looks like a complete analysis results file
+                    if 'results' in results_data or 'student-t' in results_data or 'analysis_type' in results_data:
+                        analysis_type = results_data.get("analysis_type", "Multivariate Analysis")
+                        description = results_data.get("description", "Completed analysis")
+                    else:
+                        # File exists but might not be complete
+                        status = "running"
+            else:
+                # CSV file indicates completion
+                analysis_type = "Data Analysis"
+                description = "Analysis completed with processed output"
+            completed_date = datetime.fromtimestamp(os.path.getmtime(results_file_path))
+        except Exception as e:
+            logger.warning(f"Error reading results file {results_file_path}: {e}")
+            # If we can't read the results file, it might be corrupted or incomplete
+            status = "running"
+    elif processed_file_path and os.path.exists(processed_file_path):
+        # Has processed data but no results yet
+        status = "running" 
+        analysis_type = "Data Processing"
+        description = "Analysis in progress"
+    else:
+        # Only has original file
+        status = "pending"
+        analysis_type = "Data Upload"
+        description = "Ready for processing"
+    
+    created_date = session_created_date(session_path)
+    
+    return {
+        "analysisId": session_folder.split('_')[-1] if '_' in session_folder else session_folder,
+        "name": f"Analysis {session_folder}",
+        "datasetName": dataset_name,
+        "analysisType": analysis_type,
+        "status": status,
+        "createdDate": created_date.isoformat(),
+        "completedDate": completed_date.isoformat() if completed_date else None,
+        "description": description
+    }
+
+def describe_preprocessing_options(session_path: str) -> Optional[Dict[str, Any]]:
+    """Voce di /preprocessing-options per una cartella di sessione, o None se non ha opzioni salvate"""
+    session_folder = os.path.basename(session_path)
+    preprocessing_file = os.path.join(session_path, "preprocessing_options.json")
+    if not os.path.exists(preprocessing_file):
+        return None
+    
+    try:
+        with open(preprocessing_file, 'r', encoding='utf-8') as f:
+            options_data = json.load(f)
+        
+        # Extract session info from folder name
+        session_parts = session_folder.split('_')
+        user_id = session_parts[0] if session_parts else 'Unknown'
+        
+        created_date = session_created_date(session_path)
+        
+        # Extract original file name if available
+        original_file_name = "Unknown dataset"
+        for file in os.listdir(session_path):
+            if file.startswith("original_"):
+                original_file_name = file.replace("original_", "")
+                break
+        
+        return {
+            "sessionId": session_folder,  # Use full folder name as ID
+            "userId": user_id,
+            "name": generate_preprocessing_name(options_data, original_file_name),
+            "description": generate_preprocessing_description(options_data),
+            "options": options_data,
+            "createdDate": created_date.isoformat(),
+            "originalDataset": original_file_name
+        }
+    except Exception as e:
+        logger.warning(f"Error reading preprocessing options from {preprocessing_file}: {e}")
+        return None
+
+class SessionIndex:
+    """Indice SQLite delle cartelle di sessione (user_sessions/.session_index.sqlite).
+    
+    Ogni cartella ha una riga con userId, sessionId e la sua voce di /analyses (None se non ha un
+    dataset caricato), più una riga nel catalogo delle configurazioni di preprocessing se ha
+    preprocessing_options.json. Le righe vengono aggiornate quando gli endpoint scrivono file nella
+    sessione, così /analyses, /preprocessing-options e la ricerca per sessionId non devono
+    scansionare user_sessions.
+    """
+
+    # Da incrementare quando cambia lo schema o il calcolo delle righe: l'indice viene ricostruito all'avvio
+    SCHEMA_VERSION = 3
+
+    def __init__(self, sessions_dir: str):
+        self.sessions_dir = sessions_dir
+        self.path = os.path.join(sessions_dir, ".session_index.sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (folder TEXT PRIMARY KEY, user_id TEXT, session_id TEXT, "
+            "dataset_name TEXT, status TEXT, created_date TEXT, analysis TEXT, indexed_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_session_id ON sessions (session_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_created_date ON sessions (created_date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_user_status ON sessions (user_id, status)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS preprocessing (folder TEXT PRIMARY KEY, user_id TEXT, fingerprint TEXT, "
+            "created_date TEXT, search_text TEXT, entry TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS preprocessing_fingerprint ON preprocessing (fingerprint, created_date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS preprocessing_created_date ON preprocessing (created_date)")
+        return conn
+
+    def _row(self, session_path: str) -> tuple:
+        folder = os.path.basename(session_path)
+        user_id, _, session_id = folder.partition("_")
+        analysis = describe_session_folder(session_path)
+        return (
+            folder,
+            user_id,
+            session_id or folder,
+            analysis["datasetName"] if analysis else None,
+            analysis["status"] if analysis else None,
+            analysis["createdDate"] if analysis else None,
+            json.dumps(analysis) if analysis else None,
+            time.time()
+        )
+
+    def _preprocessing_row(self, session_path: str) -> Optional[tuple]:
+        entry = describe_preprocessing_options(session_path)
+        if entry is None:
+            return None
+        # Stesse opzioni salvate da sessioni diverse sono la stessa configurazione
+        fingerprint = options_fingerprint(entry["options"])
+        search_text = " ".join([entry["name"], entry["description"], entry["originalDataset"]]).lower()
+        return (entry["sessionId"], entry["userId"], fingerprint, entry["createdDate"], search_text, json.dumps(entry))
+
+    def refresh(self, session_dir: str) -> None:
+        """Ricalcola le righe di una sessione dopo che un suo file è stato scritto o rimosso"""
+        folder = os.path.basename(session_dir)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM preprocessing WHERE folder = ?", (folder,))
+                    if os.path.isdir(session_dir):
+                        conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._row(session_dir))
+                        preprocessing_row = self._preprocessing_row(session_dir)
+                        if preprocessing_row:
+                            conn.execute("INSERT INTO preprocessing VALUES (?, ?, ?, ?, ?, ?)", preprocessing_row)
+                    else:
+                        conn.execute("DELETE FROM sessions WHERE folder = ?", (folder,))
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Failed to update session index for {session_dir}: {e}")
+
+    def rebuild(self) -> int:
+        """Ricostruisce l'indice scansionando tutte le cartelle di sessione"""
+        rows, preprocessing_rows = [], []
+        if os.path.isdir(self.sessions_dir):
+            for session_folder in list_session_folders(self.sessions_dir):
+                session_path = os.path.join(self.sessions_dir, session_folder)
+                if os.path.isdir(session_path):
+                    rows.append(self._row(session_path))
+                    preprocessing_row = self._preprocessing_row(session_path)
+                    if preprocessing_row:
+                        preprocessing_rows.append(preprocessing_row)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM sessions")
+                conn.execute("DELETE FROM preprocessing")
+                conn.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany("INSERT INTO preprocessing VALUES (?, ?, ?, ?, ?, ?)", preprocessing_rows)
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        finally:
+            conn.close()
+        return len(rows)
+
+    def ensure(self) -> None:
+        """Costruisce l'indice se manca o ha uno schema precedente (primo avvio con cartelle già presenti)"""
+        version = 0
+        if os.path.exists(self.path):
+            conn = self._connect()
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+            finally:
+                conn.close()
+        if version < self.SCHEMA_VERSION:
+            count = self.rebuild()
+            logger.info(f"Built session index with {count} sessions: {self.path}")
+
+    def list_preprocessing_options(
+        self,
+        search: Optional[str] = None,
+        user_id: Optional[str] = None,
+        distinct: bool = True,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ):
+        """Configurazioni di preprocessing dalla più recente, con il numero totale che soddisfa i filtri.
+        
+        Con distinct ogni configurazione compare una volta (la sessione più recente che la usa),
+        con sessionCount = numero di sessioni che la usano.
+        """
+        conditions, params = [], []
+        if search:
+            conditions.append("search_text LIKE ?")
+            params.append(f"%{search.lower()}%")
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        page = [limit if limit is not None else -1, offset]
+        
+        conn = self._connect()
+        try:
+            if distinct:
+                total = conn.execute(f"SELECT COUNT(DISTINCT fingerprint) FROM preprocessing{where}", params).fetchone()[0]
+                # Con MAX() SQLite restituisce le altre colonne dalla riga del massimo
+                rows = conn.execute(
+                    f"SELECT entry, MAX(created_date) AS latest, COUNT(*) FROM preprocessing{where} "
+                    f"GROUP BY fingerprint ORDER BY latest DESC LIMIT ? OFFSET ?",
+                    params + page
+                ).fetchall()
+                entries = [dict(json.loads(entry), sessionCount=count) for entry, _, count in rows]
+            else:
+                total = conn.execute(f"SELECT COUNT(*) FROM preprocessing{where}", params).fetchone()[0]
+                rows = conn.execute(
+                    f"SELECT entry FROM preprocessing{where} ORDER BY created_date DESC LIMIT ? OFFSET ?",
+                    params + page
+                ).fetchall()
+                entries = [json.loads(row[0]) for row in rows]
+        finally:
+            conn.close()
+        return entries, total
+
+    def find_folder(self, session_id: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT folder FROM sessions WHERE session_id = ? ORDER BY indexed_at DESC LIMIT 1", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def list_analyses(
+        self,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ):
+        """Voci di /analyses dalla più recente, con il numero totale di voci che soddisfano i filtri"""
+        conditions, params = ["analysis IS NOT NULL"], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if search:
+            conditions.append("dataset_name LIKE ?")
+            params.append(f"%{search}%")
+        where = " WHERE " + " AND ".join(conditions)
+        
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM sessions{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT analysis FROM sessions{where} ORDER BY created_date DESC LIMIT ? OFFSET ?",
+                params + [limit if limit is not None else -1, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows], total
+
+session_index = SessionIndex(USER_SESSIONS_DIR)
+
+@app.on_event("startup")
+async def build_session_index():
+    try:
+        await asyncio.to_thread(session_index.ensure)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Session index unavailable: {e}")
 
 # Endpoint API
 @app.get("/")
@@ -575,17 +2460,14 @@ async def preprocess_file(
                 detail=f"Unsupported file type {file_ext}. Allowed types: {', '.join(allowed_extensions)}"
             )
     
-    # Read file content once
-    content = await file.read()
-    
     # Crea cartella dell'utente per la sessione
     session_dir = create_user_session_directory(userId, sessionId)
     
     try:
-        # Salva il file caricato con il nome originale
+        # Salva il file caricato nel blob store e collegalo nella sessione con il nome originale
         input_file_path = os.path.join(session_dir, f"original_{file.filename}")
-        async with aiofiles.open(input_file_path, 'wb') as f:
-            await f.write(content)
+        file_hash = await blob_store.put_upload(file, MAX_UPLOAD_MB * 1024 * 1024, UPLOAD_CHUNK_KB * 1024)
+        await asyncio.to_thread(blob_store.link, file_hash, input_file_path)
         
         # Convert Pydantic model to dict for R script
         preprocessing_options_dict = preprocessing_options.dict()
@@ -597,6 +2479,24 @@ async def preprocess_file(
         # Salva le opzioni di preprocessing per riferimento futuro
         save_session_options(session_dir, preprocessing_options_dict)
         
+        # Stesso file, formato e opzioni già preprocessati (anche in un'altra sessione): niente R
+        cache_key = None
+        if preprocessing_cache.enabled:
+            cache_key = preprocessing_cache.key(file_hash, os.path.splitext(file.filename or "")[1], preprocessing_options_dict)
+            cached_file_path = await asyncio.to_thread(preprocessing_cache.restore, cache_key, session_dir)
+            if cached_file_path:
+                logger.info(f"Preprocessing for {userId}_{sessionId} served from cache ({cache_key})")
+                return FileResponse(
+                    cached_file_path,
+                    media_type='application/octet-stream',
+                    filename=f"processed_{file.filename}"
+                )
+        
+        # processed_data.csv può essere un hardlink a una voce di cache: va staccato prima che R lo riscriva
+        previous_processed_path = os.path.join(session_dir, "processed_data.csv")
+        if os.path.exists(previous_processed_path):
+            os.unlink(previous_processed_path)
+        
         # Prepara gli argomenti per lo script R di preprocessing
         r_args = {
             "input_file": input_file_path,
@@ -604,8 +2504,12 @@ async def preprocess_file(
             "options": preprocessing_options_dict
         }
         
-        # Lancia lo script R per preprocessing
-        result = await run_r_script("preprocess.R", r_args, timeout=900)
+        # Lancia lo script R per preprocessing (priorità interattiva nel scheduler)
+        result = await job_scheduler.submit(
+            f"preprocess_{userId}_{sessionId}_{uuid.uuid4().hex[:8]}",
+            JobPriority.interactive,
+            lambda: run_r_script("preprocess.R", r_args, timeout=900, interactive=True)
+        )
         
         # Controllo di successo
         if not result.get("success", False):
@@ -617,6 +2521,10 @@ async def preprocess_file(
         # Restituisci il file
         processed_file_path = result.get("processed_file_path")
         if processed_file_path and os.path.exists(processed_file_path):
+            # Il file prodotto da R diventa un link al blob (identico se già visto)
+            await asyncio.to_thread(blob_store.put_file, processed_file_path)
+            if cache_key:
+                await asyncio.to_thread(preprocessing_cache.put, cache_key, processed_file_path)
             return FileResponse(
                 processed_file_path,
                 media_type='application/octet-stream',
@@ -628,13 +2536,19 @@ async def preprocess_file(
                 detail="File elaborato non trovato dopo il preprocessing"
             )
     
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except SchedulerQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # File originale e processed_data.csv cambiano la voce della sessione in /analyses
+        await asyncio.to_thread(session_index.refresh, session_dir)
 
 # Lancia l'analisi 
 @app.post("/analyze", response_model=AnalysisResult)
 async def submit_analysis(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     sessionId: str = Form(...),
     userId: str = Form(...),
@@ -681,157 +2595,655 @@ async def submit_analysis(
     analysis_id = f"{userId}_{sessionId}"
     
     # Check for duplicate analysis
-    if analysis_id in analysis_storage:
-        existing_status = analysis_storage[analysis_id].get("status")
+    existing_analysis = await asyncio.to_thread(analysis_storage.get, analysis_id)
+    if existing_analysis is not None:
+        existing_status = existing_analysis.get("status")
         if existing_status in ["pending", "running"]:
             raise HTTPException(
                 status_code=409, 
                 detail="Analysis already in progress for this session"
             )
     
-    # Inizializza lo storage dell'analisi
-    analysis_storage[analysis_id] = {
-        "id": analysis_id,
-        "status": "pending",
-        "results": None,
-        "error": None,
-        "timestamp": datetime.now(),
-        "user_id": userId,
-        "session_id": sessionId
-    }
+    # Salva subito il file caricato: il job può partire quando la richiesta è già chiusa
+    session_dir = create_user_session_directory(userId, sessionId)
+    input_file_path = os.path.join(session_dir, f"analysis_{file.filename}")
+    try:
+        # Di solito è lo stesso contenuto di processed_data.csv: il blob store evita una seconda copia
+        file_hash = await blob_store.put_upload(file, MAX_UPLOAD_MB * 1024 * 1024, UPLOAD_CHUNK_KB * 1024)
+        await asyncio.to_thread(blob_store.link, file_hash, input_file_path)
+        logger.info(f"Saved upload for analysis {analysis_id} to {input_file_path}")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to write file to {input_file_path}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to write file to session directory: {e}")
+    
+    # Stesso file e stesse opzioni già analizzati: il risultato in cache è servito senza avviare R
+    cache_key = None
+    if result_cache.enabled:
+        cache_key = result_cache.key(file_hash, preprocessing_opts.dict(), analysis_opts.dict())
+        cached_result = await asyncio.to_thread(result_cache.restore, cache_key, session_dir, analysis_id)
+        if cached_result is not None:
+            logger.info(f"Analysis {analysis_id} served from result cache ({cache_key})")
+            save_session_options(session_dir, preprocessing_opts.dict(), analysis_opts.dict())
+            now = datetime.now()
+            stored = await asyncio.to_thread(
+                store_analysis,
+                analysis_id,
+                if_not_active=True,
+                status="completed",
+                results=cached_result,
+                session_dir=session_dir,
+                results_file=os.path.join(session_dir, "analysis_results.json"),
+                user_id=userId,
+                session_id=sessionId,
+                started_at=now,
+                finished_at=now
+            )
+            if stored is None:
+                raise HTTPException(status_code=409, detail="Analysis already in progress for this session")
+            await asyncio.to_thread(session_index.refresh, session_dir)
+            return AnalysisResult(
+                id=analysis_id,
+                status="completed",
+                timestamp=datetime.now()
+            )
+    
+    checkpoint_key = None
+    if ANALYSIS_CHECKPOINTS:
+        checkpoint_key = analysis_checkpoint_key(file_hash, preprocessing_opts.dict(), analysis_opts.dict())
     
-    # Avvia l'analisi in background
-    background_tasks.add_task(
-        perform_analysis,
+    # Eventi di avanzamento scritti da analysis.R (quelli di un'analisi precedente non valgono più)
+    progress_file = os.path.join(session_dir, "analysis_progress.jsonl")
+    if os.path.exists(progress_file):
+        os.unlink(progress_file)
+    
+    # Inizializza lo storage dell'analisi (atomico: un altro worker può averla appena avviata)
+    stored = await asyncio.to_thread(
+        store_analysis,
         analysis_id,
-        file,
-        preprocessing_opts.dict(),  # Convert to dict for R script
-        analysis_opts.dict()       # Convert to dict for R script
+        if_not_active=True,
+        status="pending",
+        user_id=userId,
+        session_id=sessionId,
+        progress_file=progress_file,
+        owner=PROCESS_OWNER
     )
+    if stored is None:
+        raise HTTPException(status_code=409, detail="Analysis already in progress for this session")
+    
+    # Accoda l'analisi nel scheduler (slot limitati, priorità più bassa del preprocessing)
+    try:
+        job_scheduler.submit(
+            analysis_id,
+            JobPriority.analysis,
+            lambda: perform_analysis(
+                analysis_id,
+                input_file_path,
+                preprocessing_opts.dict(),  # Convert to dict for R script
+                analysis_opts.dict(),      # Convert to dict for R script
+                cache_key,
+                checkpoint_key
+            )
+        )
+    except SchedulerQueueFull as e:
+        await asyncio.to_thread(remove_analysis, analysis_id)
+        raise HTTPException(status_code=503, detail=str(e))
     
     return AnalysisResult(
         id=analysis_id,
         status="pending",
-        timestamp=datetime.now()
+        timestamp=datetime.now(),
+        queue_position=job_scheduler.queue_position(analysis_id)
     )
 
+def load_result_table(session_dir: str, table_ref: Dict[str, Any]):
+    """Apre una tabella dei risultati scritta da R in memory-map (nessuna copia in memoria)"""
+    table_path = os.path.join(session_dir, table_ref["table_ref"])
+    source = pa.memory_map(table_path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+def result_table_rows(table) -> List[Dict[str, Any]]:
+    """Converte una tabella Arrow in righe JSON, con NaN/Inf come null (come fa jsonlite)"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_finite(column), column, pa.scalar(None, column.type))
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pylist()
+
+def resolve_result_tables(value: Any, session_dir: Optional[str]) -> Any:
+    """Sostituisce i riferimenti alle tabelle del manifest con le righe lette dai file Arrow"""
+    if isinstance(value, dict):
+        if "table_ref" in value and value.get("format") == "arrow":
+            if pa is None or not session_dir:
+                logger.error(f"Cannot load result table {value['table_ref']}: pyarrow not available")
+                return []
+            try:
+                return result_table_rows(load_result_table(session_dir, value))
+            except (OSError, pa.ArrowInvalid) as e:
+                logger.error(f"Cannot load result table {value['table_ref']}: {e}")
+                return []
+        return {key: resolve_result_tables(item, session_dir) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_result_tables(item, session_dir) for item in value]
+    return value
+
+def analysis_response_results(analysis_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Risultati pronti per la risposta: le tabelle Arrow vengono lette solo qui"""
+    results = load_analysis_results(analysis_data)
+    if isinstance(results, dict) and results.get("result_transport") == "arrow":
+        return resolve_result_tables(results, analysis_data.get("session_dir"))
+    return results
+
+# Indice SQLite delle tabelle dei risultati (results_index.sqlite nella cartella di sessione):
+# /results/{id}/tables/... pagina, ordina e filtra lato server invece di inviare tutte le righe al browser
+RESULTS_INDEX_FILE = "results_index.sqlite"
+RESULTS_INDEX_MIN_ROWS = 1000  # tabelle più piccole si scandiscono per intero in pochi ms
+RESULTS_PAGE_SIZE_MAX = 1000
+SUMMARY_RESULT_TABLES = ("summary_results", "detailed_summary", "frequency_summary")
+RESULT_FILTER_OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">=", "contains": "LIKE"}
+# jsonlite scrive i valori numerici speciali come stringhe
+SPECIAL_NUMBERS = {"NA": None, "NaN": None, "Inf": math.inf, "-Inf": -math.inf}
+
+def is_inline_result_table(value: Any) -> bool:
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(row, dict) for row in value)
+
+def is_result_table_ref(value: Any) -> bool:
+    return isinstance(value, dict) and "table_ref" in value and value.get("format") == "arrow"
+
+def iter_result_tables(results: Any):
+    """(metodo, nome, valore) di ogni tabella dei risultati, inline o riferimento a un file Arrow.
+    
+    I riepiloghi hanno metodo 'summary'.
+    """
+    if not isinstance(results, dict):
+        return
+    for method, entry in (results.get("results") or {}).items():
+        if isinstance(entry, dict):
+            for name, value in entry.items():
+                if is_inline_result_table(value) or is_result_table_ref(value):
+                    yield method, name, value
+    for name in SUMMARY_RESULT_TABLES:
+        value = results.get(name)
+        if is_inline_result_table(value) or is_result_table_ref(value):
+            yield "summary", name, value
+
+def set_result_table(results: Dict[str, Any], method: str, name: str, value: Any):
+    if method == "summary" and name in SUMMARY_RESULT_TABLES:
+        results[name] = value
+    else:
+        results["results"][method][name] = value
+
+def result_column_type(values: List[Any]) -> str:
+    """Tipo di una colonna: REAL, BOOLEAN, TEXT o JSON (liste/oggetti annidati)"""
+    seen = set()
+    for value in values:
+        if value is None or (isinstance(value, str) and value in SPECIAL_NUMBERS):
+            continue
+        if isinstance(value, bool):
+            seen.add("BOOLEAN")
+        elif isinstance(value, (int, float)):
+            seen.add("REAL")
+        elif isinstance(value, (list, dict)):
+            seen.add("JSON")
+        else:
+            seen.add("TEXT")
+    if "JSON" in seen:
+        return "JSON"
+    if "TEXT" in seen or seen == {"REAL", "BOOLEAN"}:
+        return "TEXT"
+    return seen.pop() if seen else "REAL"
+
+def encode_result_value(value: Any, column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type == "JSON":
+        return json.dumps(value, default=str)
+    if column_type in ("REAL", "BOOLEAN"):
+        return SPECIAL_NUMBERS.get(value, None) if isinstance(value, str) else value
+    return value if isinstance(value, (str, int, float)) else str(value)
+
+def decode_result_value(value: Any, column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type == "JSON":
+        return json.loads(value)
+    if column_type == "BOOLEAN":
+        return bool(value)
+    if isinstance(value, float) and math.isinf(value):
+        return "Inf" if value > 0 else "-Inf"
+    return value
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def build_results_index(index_path: str, results: Any, session_dir: str, source_stamp: str) -> int:
+    """Scrive l'indice in un file temporaneo e lo sostituisce atomicamente; restituisce il numero di tabelle
+    
+    Le tabelle Arrow vengono lette una alla volta, solo mentre sono copiate nell'indice.
+    """
+    temp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    tables = 0
+    try:
+        conn = sqlite3.connect(temp_path)
+        try:
+            conn.execute("CREATE TABLE result_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE result_tables (method TEXT, name TEXT, sql_table TEXT, rows INTEGER, "
+                "columns TEXT, PRIMARY KEY (method, name))"
+            )
+            for method, name, value in iter_result_tables(results):
+                rows = resolve_result_tables(value, session_dir)
+                if not is_inline_result_table(rows):
+                    continue
+                column_names = list(dict.fromkeys(key for row in rows for key in row))
+                column_types = {column: result_column_type([row.get(column) for row in rows]) for column in column_names}
+                sql_table = f"t{tables}"
+                column_defs = ", ".join(
+                    f"{quote_identifier(column)} {'TEXT' if column_types[column] == 'JSON' else column_types[column].replace('BOOLEAN', 'INTEGER')}"
+                    for column in column_names
+                )
+                conn.execute(f"CREATE TABLE {sql_table} ({column_defs})")
+                conn.executemany(
+                    f"INSERT INTO {sql_table} VALUES ({', '.join('?' for _ in column_names)})",
+                    (tuple(encode_result_value(row.get(column), column_types[column]) for column in column_names) for row in rows)
+                )
+                if len(rows) >= RESULTS_INDEX_MIN_ROWS:
+                    for i, column in enumerate(column_names):
+                        if column_types[column] != "JSON":
+                            conn.execute(f"CREATE INDEX {sql_table}_c{i} ON {sql_table} ({quote_identifier(column)})")
+                conn.execute(
+                    "INSERT INTO result_tables VALUES (?, ?, ?, ?, ?)",
+                    (method, name, sql_table, len(rows),
+                     json.dumps([{"name": column, "type": column_types[column]} for column in column_names]))
+                )
+                tables += 1
+            conn.execute("INSERT INTO result_meta VALUES ('source', ?)", (source_stamp,))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return tables
+
+def open_results_index(index_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(Path(index_path).as_uri() + "?mode=ro", uri=True)
+
+def results_index_stamp(index_path: str) -> Optional[str]:
+    if not os.path.exists(index_path):
+        return None
+    try:
+        conn = open_results_index(index_path)
+        try:
+            row = conn.execute("SELECT value FROM result_meta WHERE key = 'source'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+def ensure_results_index(analysis_data: Dict[str, Any]) -> str:
+    """Percorso dell'indice dell'analisi, ricostruito se analysis_results.json è cambiato"""
+    index_path = os.path.join(analysis_data["session_dir"], RESULTS_INDEX_FILE)
+    stat = os.stat(analysis_data["results_file"])
+    source_stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+    if results_index_stamp(index_path) != source_stamp:
+        started = time.monotonic()
+        tables = build_results_index(
+            index_path, load_analysis_results(analysis_data), analysis_data["session_dir"], source_stamp
+        )
+        logger.info(f"Built results index for {analysis_data['id']}: {tables} tables in {time.monotonic() - started:.2f}s")
+    return index_path
+
+def list_results_index(index_path: str) -> List[Dict[str, Any]]:
+    conn = open_results_index(index_path)
+    try:
+        entries = conn.execute("SELECT method, name, rows, columns FROM result_tables ORDER BY method, name").fetchall()
+    finally:
+        conn.close()
+    return [
+        {"method": method, "table": name, "rows": rows, "columns": json.loads(columns)}
+        for method, name, rows, columns in entries
+    ]
+
+def result_filter_value(value: str, column_type: str) -> Any:
+    if column_type == "BOOLEAN":
+        return 1 if value.lower() in ("true", "1") else 0
+    if column_type == "REAL":
+        if value in SPECIAL_NUMBERS:
+            return SPECIAL_NUMBERS[value]
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"Filter value '{value}' is not a number")
+    return value
+
+def query_results_index(
+    index_path: str,
+    method: str,
+    table: str,
+    page: int,
+    page_size: int,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[tuple]] = None
+) -> Dict[str, Any]:
+    """Una pagina di una tabella dei risultati.
+    
+    filters è una lista di (colonna, operatore, valore) con gli operatori di RESULT_FILTER_OPERATORS.
+    I valori mancanti finiscono sempre in fondo, qualunque sia il verso dell'ordinamento.
+    Solleva LookupError se la tabella non esiste e ValueError per colonne o filtri non validi.
+    """
+    conn = open_results_index(index_path)
+    try:
+        entry = conn.execute(
+            "SELECT sql_table, rows, columns FROM result_tables WHERE method = ? AND name = ?", (method, table)
+        ).fetchone()
+        if entry is None:
+            raise LookupError(f"Result table {method}/{table} not found")
+        sql_table = entry[0]
+        column_types = {column["name"]: column["type"] for column in json.loads(entry[2])}
+        
+        selected = columns or list(column_types)
+        filters = filters or []
+        referenced = selected + ([sort] if sort else []) + [column for column, _, _ in filters]
+        unknown = [column for column in dict.fromkeys(referenced) if column not in column_types]
+        if unknown:
+            raise ValueError(f"Unknown columns for {method}/{table}: {', '.join(unknown)}")
+        if sort and column_types[sort] == "JSON":
+            raise ValueError(f"Column {sort} cannot be sorted")
+        
+        conditions, params = [], []
+        for column, operator, value in filters:
+            if operator not in RESULT_FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator '{operator}'")
+            if column_types[column] == "JSON":
+                raise ValueError(f"Column {column} cannot be filtered")
+            if operator == "contains":
+                conditions.append(f"{quote_identifier(column)} LIKE ?")
+                params.append(f"%{value}%")
+            else:
+                conditions.append(f"{quote_identifier(column)} {RESULT_FILTER_OPERATORS[operator]} ?")
+                params.append(result_filter_value(value, column_types[column]))
+        
+        def where(*extra: str) -> str:
+            clauses = conditions + list(extra)
+            return " WHERE " + " AND ".join(clauses) if clauses else ""
+        
+        select = f"SELECT {', '.join(quote_identifier(column) for column in selected)} FROM {sql_table}"
+        offset = (page - 1) * page_size
+        if not conditions:
+            total = entry[1]
+        else:
+            total = conn.execute(f"SELECT COUNT(*) FROM {sql_table}{where()}", params).fetchone()[0]
+        
+        if not sort:
+            rows = conn.execute(f"{select}{where()} ORDER BY rowid LIMIT ? OFFSET ?", params + [page_size, offset]).fetchall()
+        else:
+            # Prima i valori presenti (l'indice sulla colonna copre l'ordinamento), poi i mancanti
+            sort_column = quote_identifier(sort)
+            direction = "DESC" if descending else "ASC"
+            present = conn.execute(
+                f"SELECT COUNT(*) FROM {sql_table}{where(f'{sort_column} IS NOT NULL')}", params
+            ).fetchone()[0]
+            rows = []
+            if offset < present:
+                rows = conn.execute(
+                    f"{select}{where(f'{sort_column} IS NOT NULL')} ORDER BY {sort_column} {direction}, rowid LIMIT ? OFFSET ?",
+                    params + [page_size, offset]
+                ).fetchall()
+            if len(rows) < page_size:
+                rows += conn.execute(
+                    f"{select}{where(f'{sort_column} IS NULL')} ORDER BY rowid LIMIT ? OFFSET ?",
+                    params + [page_size - len(rows), max(0, offset - present)]
+                ).fetchall()
+    finally:
+        conn.close()
+    
+    return {
+        "method": method,
+        "table": table,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "columns": [{"name": column, "type": column_types[column]} for column in selected],
+        "rows": [
+            {column: decode_result_value(value, column_types[column]) for column, value in zip(selected, row)}
+            for row in rows
+        ]
+    }
+
+# Formato su disco dei risultati: analysis_results.json è un manifest compatto, le tabelle sono file
+# Arrow in result_tables/ (scritti da R con il pacchetto arrow, altrimenti convertiti qui)
+def write_result_table(session_dir: str, table_name: str, rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Scrive una tabella inline come file Arrow; None se le colonne non hanno un tipo Arrow coerente"""
+    column_names = list(dict.fromkeys(key for row in rows for key in row))
+    columns = {}
+    for column in column_names:
+        values = [row.get(column) for row in rows]
+        column_type = result_column_type(values)
+        if column_type == "JSON":
+            return None
+        if column_type == "REAL":
+            values = [encode_result_value(value, column_type) for value in values]
+        columns[column] = values
+    try:
+        table = pa.table(columns)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    
+    relative_path = f"result_tables/{table_name}.arrow"
+    with pa.OSFile(os.path.join(session_dir, relative_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {"table_ref": relative_path, "format": "arrow", "rows": len(rows), "columns": column_names}
+
+def write_inline_result_tables(session_dir: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Sposta le tabelle restituite inline da R (trasporto json) in file Arrow, come fa analysis.R"""
+    tables_dir = os.path.join(session_dir, "result_tables")
+    # File nuovi: quelli vecchi possono essere hardlink verso la cache dei risultati
+    shutil.rmtree(tables_dir, ignore_errors=True)
+    os.makedirs(tables_dir, exist_ok=True)
+    
+    tables_written = 0
+    for method, name, value in list(iter_result_tables(result)):
+        if not is_inline_result_table(value):
+            continue
+        table_name = name if method == "summary" else f"{method}__{name}"
+        table_ref = write_result_table(session_dir, table_name, value)
+        if table_ref is not None:
+            set_result_table(result, method, name, table_ref)
+            tables_written += 1
+    
+    if tables_written:
+        result["result_transport"] = "arrow"
+    logger.info(f"Result tables written to {tables_dir}: {tables_written}")
+    return result
+
+def write_analysis_results(session_dir: str, result: Any) -> Any:
+    """Salva il risultato di un'analisi e restituisce quanto scritto in analysis_results.json"""
+    if pa is not None and isinstance(result, dict) and result.get("result_transport") != "arrow":
+        result = write_inline_result_tables(session_dir, result)
+    
+    results_file = os.path.join(session_dir, "analysis_results.json")
+    temp_file = f"{results_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(result, f, separators=(",", ":"), default=str)
+        os.replace(temp_file, results_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+    return result
+
+async def follow_analysis_progress(analysis_id: str, progress_file: str):
+    """Riassume gli eventi scritti da analysis.R nel campo progress dello stato dell'analisi"""
+    offset = 0
+    methods_total = None
+    methods_completed = 0
+    running_methods: List[str] = []
+    while True:
+        events, offset = await asyncio.to_thread(read_progress_events, progress_file, offset)
+        for event in events:
+            kind = event.get("event")
+            if kind == "methods_planned":
+                methods_total = event.get("total")
+            elif kind == "method_started":
+                running_methods.append(event.get("method"))
+            elif kind == "method_finished":
+                if event.get("method") in running_methods:
+                    running_methods.remove(event.get("method"))
+                methods_completed += 1
+        if events:
+            await asyncio.to_thread(update_analysis, analysis_id, expected_status=("running",), progress={
+                "methods_total": methods_total,
+                "methods_completed": methods_completed,
+                "running_methods": list(running_methods),
+                "last_event": events[-1]
+            })
+        await asyncio.sleep(ANALYSIS_EVENTS_POLL_SECONDS)
+
+# Checkpoint per metodo (method_checkpoints/ nella sessione): analysis.R salva ogni metodo concluso e,
+# se l'analisi viene rilanciata con stesso input, opzioni e versione dello script, esegue solo quelli mancanti
+ANALYSIS_CHECKPOINTS = os.environ.get("OMICS_ANALYSIS_CHECKPOINTS", "1") != "0"
+
+def analysis_checkpoint_key(file_hash: str, preprocessing_options: Dict[str, Any], analysis_options: Dict[str, Any]) -> str:
+    parts = [file_hash, options_fingerprint(preprocessing_options), options_fingerprint(analysis_options), ANALYSIS_SCRIPT_HASH]
+    return hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest()
+
+def timed_out_methods(result: Dict[str, Any]) -> List[str]:
+    """Metodi interrotti dal limite di tempo (status "timed_out") in un risultato di analysis.R"""
+    methods = (result.get("analysis_summary") or {}).get("methods_timed_out") or []
+    if isinstance(methods, str):
+        methods = [methods]  # jsonlite con auto_unbox scrive un solo metodo come stringa
+    sections = result.get("results") or {}
+    if isinstance(sections, dict):
+        methods = list(methods) + [
+            name for name, section in sections.items()
+            if isinstance(section, dict) and section.get("status") == "timed_out" and name not in methods
+        ]
+    return list(methods)
+
+# Con lo stato condiviso un annullamento può arrivare da un altro worker uvicorn
+CANCELLATION_CHECK_SECONDS = 1.0
+
+async def watch_analysis_cancellation(analysis_id: str):
+    """Interrompe il job locale quando un altro worker segna l'analisi come cancelled"""
+    while True:
+        await asyncio.sleep(CANCELLATION_CHECK_SECONDS)
+        record = await asyncio.to_thread(analysis_storage.get, analysis_id)
+        if record is not None and record["status"] == "cancelled":
+            job_scheduler.cancel(analysis_id)
+            return
+
 async def perform_analysis(
     analysis_id: str,
-    file: UploadFile,
+    input_file_path: str,
     preprocessing_options: Dict[str, Any],
-    analysis_options: Dict[str, Any]
+    analysis_options: Dict[str, Any],
+    cache_key: Optional[str] = None,
+    checkpoint_key: Optional[str] = None
 ):
-    """Effettua l'analisi in background"""
+    """Effettua l'analisi quando il scheduler le assegna uno slot"""
     
     # Estrae userId e sessionId dall'analysis_id
     user_id, session_id = analysis_id.split('_', 1)
     
     # Usa la directory persistente della sessione utente
     session_dir = create_user_session_directory(user_id, session_id)
-    
-    # Legge immediatamente il contenuto del file per evitare problemi di chiusura file
-    try:
-        # Controlla se il file è ancora leggibile
-        if hasattr(file, 'file') and file.file.closed:
-            logger.warning(f"File {file.filename} is already closed, trying to reopen from session")
-            # Prova a trovare il file nella directory della sessione invece
-            if os.path.exists(session_dir):
-                session_files = [f for f in os.listdir(session_dir) if f.startswith('original_') or f.startswith('processed_')]
-                if session_files:
-                    # Usa il file più recente
-                    most_recent_file = max(session_files, key=lambda f: os.path.getmtime(os.path.join(session_dir, f)))
-                    existing_file_path = os.path.join(session_dir, most_recent_file)
-                    logger.info(f"Using existing file from session: {existing_file_path}")
-                    with open(existing_file_path, 'rb') as f:
-                        file_content = f.read()
-                else:
-                    raise Exception("No existing files found in session and uploaded file is closed")
-            else:
-                raise Exception("Session directory does not exist and uploaded file is closed")
-        else:
-            # Prova a leggere il file normalmente
-            try:
-                file_content = await file.read()
-                logger.info(f"Read {len(file_content)} bytes from uploaded file for analysis {analysis_id}")
-            except Exception as read_error:
-                logger.warning(f"Failed to read uploaded file, trying to use existing session file: {read_error}")
-                # Fallback al file della sessione
-                if os.path.exists(session_dir):
-                    session_files = [f for f in os.listdir(session_dir) if f.startswith('original_') or f.startswith('processed_')]
-                    if session_files:
-                        most_recent_file = max(session_files, key=lambda f: os.path.getmtime(os.path.join(session_dir, f)))
-                        existing_file_path = os.path.join(session_dir, most_recent_file)
-                        logger.info(f"Using existing file from session: {existing_file_path}")
-                        with open(existing_file_path, 'rb') as f:
-                            file_content = f.read()
-                    else:
-                        raise Exception(f"Failed to read uploaded file and no session files available: {read_error}")
-                else:
-                    raise Exception(f"Failed to read uploaded file and session directory does not exist: {read_error}")
-                    
-    except Exception as e:
-        logger.error(f"Failed to read file content: {e}")
-        analysis_storage[analysis_id].update({
-            "status": "error",
-            "error": f"Failed to read file content: {e}",
-            "timestamp": datetime.now()
-        })
-        return
+    progress_file = (await asyncio.to_thread(analysis_storage.get, analysis_id) or {}).get("progress_file")
+    progress_task = None
+    cancellation_task = None
     
     try:
-        # Aggiorna lo status a running
-        analysis_storage[analysis_id]["status"] = "running"
+        # Aggiorna lo status a running (solo se è ancora in coda: può essere stata annullata)
+        started = await asyncio.to_thread(
+            update_analysis, analysis_id, expected_status=("pending",), status="running", started_at=datetime.now()
+        )
+        if started is None:
+            logger.warning(f"Analysis {analysis_id} is no longer pending, not starting it")
+            return
         logger.info(f"Analysis {analysis_id} started")
-        
-        # Salva il contenuto del file caricato
-        input_file_path = os.path.join(session_dir, f"analysis_{file.filename}")
-        
-        # Scrive il contenuto del file che abbiamo già letto
-        try:
-            async with aiofiles.open(input_file_path, 'wb') as f:
-                await f.write(file_content)
-        except Exception as e:
-            logger.error(f"Failed to write file to {input_file_path}: {e}")
-            raise Exception(f"Failed to write file to session directory: {e}")
-        
-        logger.info(f"File saved to: {input_file_path}")
+        if progress_file:
+            progress_task = asyncio.create_task(follow_analysis_progress(analysis_id, progress_file))
+        if not isinstance(analysis_storage, MemoryStateStore):
+            cancellation_task = asyncio.create_task(watch_analysis_cancellation(analysis_id))
         
         # Salva le opzioni di analisi 
         save_session_options(session_dir, preprocessing_options, analysis_options)
         
         # Prepara gli argomenti per lo script R
+        execution = {
+            "method_cores": ANALYSIS_METHOD_CORES,
+            "method_time_limits": METHOD_TIME_LIMITS,
+            "deadline_seconds": ANALYSIS_METHODS_DEADLINE_SECONDS
+        }
+        if checkpoint_key:
+            execution.update(checkpoint_dir=os.path.join(session_dir, "method_checkpoints"), checkpoint_key=checkpoint_key)
         r_args = {
             "input_file": input_file_path,
             "output_dir": session_dir,  # Usa directory persistente
             "preprocessing_options": preprocessing_options,
             "analysis_options": analysis_options,
-            "analysis_id": analysis_id
+            "analysis_id": analysis_id,
+            "execution": execution,
+            "result_transport": RESULT_TRANSPORT,
+            "progress_file": progress_file
         }
         
         # Lancia lo script R per l'analisi
         logger.info(f"Starting R script execution for analysis {analysis_id}")
-        result = await run_r_script("analysis.R", r_args, timeout=3600)  # timeout di 1 ora (aumentato da 10 minuti)
+        result = await run_r_script("analysis.R", r_args, timeout=ANALYSIS_TIMEOUT_SECONDS)
         logger.info(f"R script completed for analysis {analysis_id}")
+        # Da qui lo stato cambia solo per il completamento (un ETag appena letto resta valido)
+        if progress_task is not None:
+            progress_task.cancel()
+        if cancellation_task is not None:
+            cancellation_task.cancel()
         
         # Salva i risultati dell'analisi
         results_file = os.path.join(session_dir, "analysis_results.json")
         logger.info(f"Saving results to: {results_file}")
         
         try:
-            with open(results_file, 'w') as f:
-                json.dump(result, f, indent=2, default=str)
+            result = await asyncio.to_thread(write_analysis_results, session_dir, result)
             logger.info(f"Results saved successfully for analysis {analysis_id}")
         except Exception as e:
             logger.error(f"Failed to save results file: {e}")
             raise Exception(f"Failed to save results file: {e}")
         
         # Aggiorna lo storage con lo status e i risultati
-        analysis_storage[analysis_id].update({
-            "status": "completed",
-            "results": result,
-            "session_dir": session_dir,
-            "timestamp": datetime.now()
-        })
+        completed = await asyncio.to_thread(
+            update_analysis,
+            analysis_id,
+            expected_status=("running",),
+            status="completed",
+            results=result,
+            results_file=results_file,
+            session_dir=session_dir,
+            finished_at=datetime.now()
+        )
+        
+        # L'indice delle tabelle è pronto prima che il client chieda la prima pagina
+        if completed is not None and isinstance(result, dict) and result.get("status") == "completed":
+            try:
+                await asyncio.to_thread(ensure_results_index, completed)
+            except (OSError, sqlite3.Error, ValueError) as e:
+                logger.warning(f"Could not build results index for {analysis_id}: {e}")
+        
+        # Solo le analisi completate da R finiscono nella cache dei risultati; con metodi interrotti dal
+        # limite di tempo no, così un nuovo invio (magari con limiti più alti) li riesegue
+        if cache_key and completed is not None and isinstance(result, dict) and result.get("status") == "completed":
+            timed_out = timed_out_methods(result)
+            if timed_out:
+                logger.info(f"Analysis {analysis_id} not cached: methods timed out ({', '.join(timed_out)})")
+            else:
+                await asyncio.to_thread(result_cache.put, cache_key, session_dir, result)
         
         logger.info(f"Analysis {analysis_id} completed successfully")
         logger.info(f"Results available at: /results/{analysis_id}")
@@ -840,171 +3252,293 @@ async def perform_analysis(
     except HTTPException as e:
         # Errori HTTP specifici da run_r_script
         logger.error(f"Analysis {analysis_id} failed with HTTP error: {e.detail}")
-        analysis_storage[analysis_id].update({
-            "status": "error",
-            "error": e.detail,
-            "timestamp": datetime.now()
-        })
+        await asyncio.to_thread(
+            update_analysis, analysis_id, expected_status=ACTIVE_STATUSES, status="error", error=e.detail, finished_at=datetime.now()
+        )
     except Exception as e:
         # Altri errori
         logger.error(f"Analysis {analysis_id} failed with unexpected error: {str(e)}")
-        analysis_storage[analysis_id].update({
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now()
-        })
-
-@app.get("/status/{analysis_id}", response_model=AnalysisResult)
-def get_analysis_status(analysis_id: str):
-    """Ottieni lo status dell'analisi con informazioni complete"""
-    
-    # Prima controlla se l'analisi è nel memory storage
-    if analysis_id in analysis_storage:
-        analysis_data = analysis_storage[analysis_id]
-        return AnalysisResult(
-            id=analysis_data["id"],
-            status=analysis_data["status"],
-            results=analysis_data.get("results"),
-            error=analysis_data.get("error"),
-            timestamp=analysis_data["timestamp"]
+        await asyncio.to_thread(
+            update_analysis, analysis_id, expected_status=ACTIVE_STATUSES, status="error", error=str(e), finished_at=datetime.now()
         )
+    except asyncio.CancelledError:
+        # Annullata con DELETE /analysis/{id}: lo stato cancelled è già registrato
+        logger.info(f"Analysis {analysis_id} cancelled, R process terminated")
+        raise
+    finally:
+        if progress_task is not None:
+            progress_task.cancel()
+        if cancellation_task is not None:
+            cancellation_task.cancel()
+        await asyncio.to_thread(session_index.refresh, session_dir)
+
+# Long-poll di /status: oltre alle nuove versioni si ricontrolla periodicamente la posizione in coda
+STATUS_MAX_WAIT_SECONDS = 60
+STATUS_QUEUE_CHECK_SECONDS = 1.0
+
+def analysis_status_etag(analysis_data: Dict[str, Any]) -> str:
+    queue_position = job_scheduler.queue_position(analysis_data["id"])
+    return f'W/"{analysis_data.get("version", 0)}-{queue_position or 0}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+@app.get("/status/{analysis_id}", response_model=AnalysisStatusResponse)
+async def get_analysis_status(
+    analysis_id: str,
+    request: Request,
+    response: Response,
+    wait: float = Query(0, ge=0, le=STATUS_MAX_WAIT_SECONDS)
+):
+    """Ottieni lo status dell'analisi (senza risultati: quelli sono su /results)
     
-    # Se non in memoria, prova a caricare dal file system
-    try:
-        # Parsa analysis_id per ottenere user_id e session_id
-        if "_" in analysis_id:
-            user_id, session_id = analysis_id.split("_", 1)
-        else:
-            # For plain UUIDs, assume it's a session ID and try to find the corresponding user session
-            # First try to find any session directory that ends with this session ID
-            session_id = analysis_id
-            user_id = None
-            
-            # Look for existing session directories
-            if os.path.exists("user_sessions"):
-                for session_dir_name in os.listdir("user_sessions"):
-                    if session_dir_name.endswith(f"_{session_id}"):
-                        user_id = session_dir_name.split("_")[0]
-                        break
-            
-            # If not found, default to MasterTest for backward compatibility
-            if not user_id:
-                user_id = "MasterTest"
-        
-        session_dir = create_user_session_directory(user_id, session_id)
-        results_file = os.path.join(session_dir, "analysis_results.json")
-        
-        if os.path.exists(results_file):
-            logger.info(f"Loading existing results from: {results_file}")
-            with open(results_file, 'r') as f:
-                results = json.load(f)
-            
-            # Restore to memory storage for future requests
-            analysis_storage[analysis_id] = {
-                "id": analysis_id,
-                "status": "completed",
-                "results": results,
-                "session_dir": session_dir,
-                "timestamp": datetime.now()
-            }
-            
-            return AnalysisResult(
-                id=analysis_id,
-                status="completed",
-                results=results,
-                error=None,
-                timestamp=datetime.now()
-            )
-    except Exception as e:
-        logger.error(f"Error loading results from file: {e}")
+    Con If-None-Match uguale all'ETag corrente risponde 304; se in più wait > 0 la risposta
+    aspetta fino a wait secondi che l'analisi cambi (long-poll).
+    """
+    analysis_data = await asyncio.to_thread(find_analysis, analysis_id)
+    if analysis_data is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
-    raise HTTPException(status_code=404, detail="Analysis not found")
+    if_none_match = request.headers.get("if-none-match")
+    etag = analysis_status_etag(analysis_data)
+    if wait > 0 and etag_matches(if_none_match, etag):
+        deadline = time.monotonic() + wait
+        while analysis_data["status"] not in FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or await request.is_disconnected():
+                break
+            await wait_for_analysis_change(analysis_id, min(remaining, STATUS_QUEUE_CHECK_SECONDS))
+            analysis_data = await asyncio.to_thread(analysis_storage.get, analysis_id)
+            if analysis_data is None:
+                raise HTTPException(status_code=404, detail="Analysis not found")
+            etag = analysis_status_etag(analysis_data)
+            if not etag_matches(if_none_match, etag):
+                break
+    
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return analysis_status_response(analysis_data)
+
+def analysis_status_response(analysis_data: Dict[str, Any]) -> AnalysisStatusResponse:
+    analysis_id = analysis_data["id"]
+    return AnalysisStatusResponse(
+        id=analysis_id,
+        status=analysis_data["status"],
+        version=analysis_data.get("version", 0),
+        error=analysis_data.get("error"),
+        queue_position=job_scheduler.queue_position(analysis_id),
+        progress=analysis_data.get("progress"),
+        created_at=analysis_data.get("created_at"),
+        started_at=analysis_data.get("started_at"),
+        finished_at=analysis_data.get("finished_at"),
+        timestamp=analysis_data["timestamp"],
+        has_results=analysis_has_results(analysis_data)
+    )
+
+@app.delete("/analysis/{analysis_id}", response_model=AnalysisStatusResponse)
+async def cancel_analysis(analysis_id: str):
+    """Annulla un'analisi in coda o in esecuzione: termina il processo R (con i figli) e libera lo slot"""
+    analysis_data = await asyncio.to_thread(
+        update_analysis,
+        analysis_id,
+        expected_status=ACTIVE_STATUSES,
+        status="cancelled",
+        finished_at=datetime.now()
+    )
+    if analysis_data is None:
+        existing = await asyncio.to_thread(analysis_storage.get, analysis_id)
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+        raise HTTPException(status_code=409, detail=f"Analysis is already {existing['status']}")
+    
+    if job_scheduler.cancel(analysis_id):
+        logger.info(f"Analysis {analysis_id} cancelled")
+    else:
+        # Job di un altro worker: lo interrompe watch_analysis_cancellation entro CANCELLATION_CHECK_SECONDS
+        logger.info(f"Analysis {analysis_id} cancelled, owned by {analysis_data.get('owner')}")
+    return analysis_status_response(analysis_data)
 
 @app.get("/status/{analysis_id}/simple")
 def get_analysis_status_simple(analysis_id: str):
     """Ottieni solo lo status dell'analisi per polling leggero"""
     
-    if analysis_id not in analysis_storage:
+    analysis_data = analysis_storage.get(analysis_id)
+    if analysis_data is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    analysis_data = analysis_storage[analysis_id]
-    
     return {
         "id": analysis_id,
         "status": analysis_data["status"],
-        "hasResults": analysis_data.get("results") is not None,
+        "hasResults": analysis_has_results(analysis_data),
         "hasError": analysis_data.get("error") is not None,
         "timestamp": analysis_data["timestamp"],
+        "queuePosition": job_scheduler.queue_position(analysis_id),
         "message": "Analysis completed successfully" if analysis_data["status"] == "completed" else None
     }
 
-@app.get("/results/{analysis_id}", response_model=AnalysisResult)
-def get_analysis_results(analysis_id: str):
-    """Ottieni risultati dell'analisi"""
+# Stream degli eventi di avanzamento (Server-Sent Events) al posto del polling di /status
+ANALYSIS_EVENTS_POLL_SECONDS = float(os.environ.get("OMICS_ANALYSIS_EVENTS_POLL_SECONDS", "0.5"))
+ANALYSIS_EVENTS_HEARTBEAT_SECONDS = 15
+
+def read_progress_events(progress_file: str, offset: int):
+    """Legge gli eventi JSON completi (una riga ciascuno) scritti da R dopo offset"""
+    events = []
+    try:
+        with open(progress_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return events, offset
+    
+    # Una riga senza newline finale è ancora in scrittura: verrà letta al giro successivo
+    complete = data[:data.rfind(b"\n") + 1]
+    for line in complete.splitlines():
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            logger.warning(f"Skipping malformed progress event in {progress_file}: {line[:200]!r}")
+    return events, offset + len(complete)
+
+def sse_message(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/analysis/{analysis_id}/events")
+async def stream_analysis_events(analysis_id: str, request: Request):
+    """Eventi dell'analisi: 'status' a ogni cambio di stato/posizione in coda, 'progress' da analysis.R"""
     
-    # First check if analysis is in memory storage
-    if analysis_id in analysis_storage:
-        analysis_data = analysis_storage[analysis_id]
-        return AnalysisResult(
-            id=analysis_data["id"],
-            status=analysis_data["status"],
-            results=analysis_data.get("results"),
-            error=analysis_data.get("error"),
-            timestamp=analysis_data["timestamp"]
-        )
+    if not await asyncio.to_thread(analysis_storage.__contains__, analysis_id):
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
-    # If not in memory, try to load from file system
-    try:
-        # Parse analysis_id to get user_id and session_id
-        if "_" in analysis_id:
-            user_id, session_id = analysis_id.split("_", 1)
-        else:
-            # For plain UUIDs, assume it's a session ID and try to find the corresponding user session
-            # First try to find any session directory that ends with this session ID
-            session_id = analysis_id
-            user_id = None
+    async def event_stream():
+        offset = 0
+        last_status = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            analysis_data = await asyncio.to_thread(analysis_storage.get, analysis_id)
+            if analysis_data is None:
+                break
             
-            # Look for existing session directories
-            if os.path.exists("user_sessions"):
-                for session_dir_name in os.listdir("user_sessions"):
-                    if session_dir_name.endswith(f"_{session_id}"):
-                        user_id = session_dir_name.split("_")[0]
-                        break
+            messages = []
+            progress_file = analysis_data.get("progress_file")
+            if progress_file:
+                events, offset = await asyncio.to_thread(read_progress_events, progress_file, offset)
+                messages.extend(sse_message("progress", event) for event in events)
             
-            # If not found, default to MasterTest for backward compatibility
-            if not user_id:
-                user_id = "MasterTest"
-        
-        session_dir = create_user_session_directory(user_id, session_id)
-        results_file = os.path.join(session_dir, "analysis_results.json")
-        
-        if os.path.exists(results_file):
-            logger.info(f"Loading existing results from: {results_file}")
-            with open(results_file, 'r') as f:
-                results = json.load(f)
+            status = (analysis_data["status"], job_scheduler.queue_position(analysis_id))
+            if status != last_status:
+                last_status = status
+                messages.append(sse_message("status", {
+                    "id": analysis_id,
+                    "status": status[0],
+                    "queuePosition": status[1],
+                    "error": analysis_data.get("error")
+                }))
             
-            # Restore to memory storage for future requests
-            analysis_storage[analysis_id] = {
-                "id": analysis_id,
-                "status": "completed",
-                "results": results,
-                "session_dir": session_dir,
-                "timestamp": datetime.now()
-            }
+            if messages:
+                yield "".join(messages)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > ANALYSIS_EVENTS_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
             
-            return AnalysisResult(
-                id=analysis_id,
-                status="completed",
-                results=results,
-                error=None,
-                timestamp=datetime.now()
-            )
-        else:
-            logger.warning(f"Results file not found: {results_file}")
-    except Exception as e:
+            if status[0] in FINISHED_STATUSES:
+                break
+            await asyncio.sleep(ANALYSIS_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/results/{analysis_id}", response_model=AnalysisResult)
+async def get_analysis_results(analysis_id: str):
+    """Ottieni risultati dell'analisi"""
+    
+    analysis_data = await asyncio.to_thread(find_analysis, analysis_id)
+    if analysis_data is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    try:
+        results = await asyncio.to_thread(analysis_response_results, analysis_data)
+    except (OSError, ValueError) as e:
         logger.error(f"Error loading results from file: {e}")
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    # Stessa forma di AnalysisResult, ma senza validare e ricodificare tutto il payload
+    return FastJSONResponse({
+        "id": analysis_data["id"],
+        "status": analysis_data["status"],
+        "results": results,
+        "error": analysis_data.get("error"),
+        "timestamp": analysis_data["timestamp"],
+        "queue_position": None
+    })
+
+def completed_analysis(analysis_id: str) -> Dict[str, Any]:
+    analysis_data = find_analysis(analysis_id)
+    if analysis_data is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if analysis_data["status"] != "completed" or not analysis_data.get("results_file"):
+        raise HTTPException(status_code=409, detail=f"Analysis is {analysis_data['status']}, results not available")
+    return analysis_data
+
+@app.get("/results/{analysis_id}/tables")
+async def list_analysis_result_tables(analysis_id: str):
+    """Elenco delle tabelle dei risultati interrogabili, con numero di righe e colonne"""
+    analysis_data = await asyncio.to_thread(completed_analysis, analysis_id)
+    try:
+        index_path = await asyncio.to_thread(ensure_results_index, analysis_data)
+        tables = await asyncio.to_thread(list_results_index, index_path)
+    except (OSError, sqlite3.Error, ValueError) as e:
+        logger.error(f"Results index unavailable for {analysis_id}: {e}")
+        raise HTTPException(status_code=500, detail="Results index unavailable")
+    return FastJSONResponse({"id": analysis_id, "tables": tables})
+
+@app.get("/results/{analysis_id}/tables/{method}/{table}")
+async def query_analysis_result_table(
+    analysis_id: str,
+    method: str,
+    table: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=RESULTS_PAGE_SIZE_MAX),
+    sort: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    filter: List[str] = Query([], description="column:operator:value, operator one of eq, ne, lt, le, gt, ge, contains")
+):
+    """Una pagina di una tabella dei risultati (es. method=student-t, table=data), ordinata e filtrata lato server"""
+    analysis_data = await asyncio.to_thread(completed_analysis, analysis_id)
     
-    raise HTTPException(status_code=404, detail="Analysis not found")
+    filters = []
+    for item in filter:
+        parts = item.split(":", 2)
+        if len(parts) != 3:
+            raise HTTPException(status_code=400, detail=f"Invalid filter '{item}', expected column:operator:value")
+        filters.append(tuple(parts))
+    selected_columns = [column.strip() for column in columns.split(",") if column.strip()] if columns else None
+    
+    try:
+        index_path = await asyncio.to_thread(ensure_results_index, analysis_data)
+        page_data = await asyncio.to_thread(
+            query_results_index, index_path, method, table, page, page_size,
+            sort, order == "desc", selected_columns, filters
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Results index query failed for {analysis_id}: {e}")
+        raise HTTPException(status_code=500, detail="Results index unavailable")
+    
+    return FastJSONResponse({"id": analysis_id, **page_data})
 
 #Ottieni informazioni sulla sessione e lista dei file
 @app.get("/session/{user_id}/{session_id}")
@@ -1041,14 +3575,14 @@ def get_session_info(user_id: str, session_id: str):
         with open(analysis_file, 'r') as f:
             analysis_options = json.load(f)
     
-    return {
+    return FastJSONResponse({
         "user_id": user_id,
         "session_id": session_id,
         "session_dir": session_dir,
         "files": files,
         "preprocessing_options": preprocessing_options,
         "analysis_options": analysis_options
-    }
+    })
 
 #Superficiale in production, ma utile per test in locale
 @app.get("/session/{user_id}/{session_id}/download/{filename}")
@@ -1074,7 +3608,13 @@ def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now(),
-        "active_analyses": len(analysis_storage)
+        "active_analyses": len(analysis_storage),
+        "result_memory": result_bodies.status(),
+        "r_workers": r_worker_pool.status() if r_worker_pool is not None else None,
+        "scheduler": job_scheduler.status(),
+        "result_cache": result_cache.status(),
+        "preprocessing_cache": preprocessing_cache.status(),
+        "blob_store": blob_store.status()
     }
 
 # Test per l'endpoint di R (autoprodotto da GPT)
@@ -1105,111 +3645,25 @@ def test_connectivity():
         "timestamp": datetime.now()
     }
 
-# Ottieni le analisi precedenti dalle sessioni utente
+# Ottieni le analisi precedenti dalle sessioni utente (dall'indice, senza scansionare le cartelle)
 @app.get("/analyses")
-def get_previous_analyses():
-    """Ottieni la lista delle analisi precedenti dalla cartella user sessions"""
+async def get_previous_analyses(
+    status: Optional[str] = Query(None, description="pending, running or completed"),
+    user_id: Optional[str] = None,
+    search: Optional[str] = Query(None, description="Substring of the dataset name"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Ottieni la lista delle analisi precedenti, dalla più recente (X-Total-Count: totale senza limit)"""
     try:
-        user_sessions_dir = "user_sessions"
-        analyses = []
-        
-        if not os.path.exists(user_sessions_dir):
-            return analyses
-        
-        # Scansiona le directory delle sessioni utente
-        for session_folder in os.listdir(user_sessions_dir):
-            session_path = os.path.join(user_sessions_dir, session_folder)
-            if os.path.isdir(session_path):
-                # Controlla se questa sessione ha dati di analisi
-                original_file_path = None
-                processed_file_path = None
-                preprocessing_options_path = None
-                results_file_path = None
-                
-                # Cerca i file chiave nella sessione
-                for file in os.listdir(session_path):
-                    if file.startswith("original_"):
-                        original_file_path = os.path.join(session_path, file)
-                    elif file == "processed_data.csv":
-                        processed_file_path = os.path.join(session_path, file)
-                    elif file == "preprocessing_options.json":
-                        preprocessing_options_path = os.path.join(session_path, file)
-                    elif file in ["analysis_results.json", "complete_results.json", "results.json"]:
-                        results_file_path = os.path.join(session_path, file)
-                        # Controlla anche eventuali file CSV di analisi processata che indicano completamento
-                    elif file.startswith("analysis_processed_") and file.endswith(".csv"):
-                        # Questo indica che l'analisi è stata completata e processata
-                        if not results_file_path:  # Imposta solo se non abbiamo un file di risultati JSON
-                            results_file_path = os.path.join(session_path, file)
-                
-                if original_file_path:  # Include solo sessioni con dati
-                    # Estrae il nome del dataset dal file originale
-                    dataset_name = os.path.basename(original_file_path).replace("original_", "")
-                    
-                    # Determina lo status dell'analisi
-                    status = "pending"
-                    analysis_type = "Unknown"
-                    description = None
-                    completed_date = None
-                    
-                    if results_file_path and os.path.exists(results_file_path):
-                        status = "completed"
-                        # Try to read analysis type from results
-                        try:
-                            if results_file_path.endswith('.json'):
-                                with open(results_file_path, 'r') as f:
-                                    results_data = json.load(f)
-                                    # Check if this looks like a complete analysis results file
-                                    if 'results' in results_data or 'student-t' in results_data or 'analysis_type' in results_data:
-                                        analysis_type = results_data.get("analysis_type", "Multivariate Analysis")
-                                        description = results_data.get("description", "Completed analysis")
-                                    else:
-                                        # File exists but might not be complete
-                                        status = "running"
-                            else:
-                                # CSV file indicates completion
-                                analysis_type = "Data Analysis"
-                                description = "Analysis completed with processed output"
-                            completed_date = datetime.fromtimestamp(os.path.getmtime(results_file_path))
-                        except Exception as e:
-                            logger.warning(f"Error reading results file {results_file_path}: {e}")
-                            # If we can't read the results file, it might be corrupted or incomplete
-                            status = "running"
-                    elif processed_file_path and os.path.exists(processed_file_path):
-                        # Has processed data but no results yet
-                        status = "running" 
-                        analysis_type = "Data Processing"
-                        description = "Analysis in progress"
-                    else:
-                        # Only has original file
-                        status = "pending"
-                        analysis_type = "Data Upload"
-                        description = "Ready for processing"
-                    
-                    # Get creation date from original file
-                    created_date = datetime.fromtimestamp(os.path.getctime(original_file_path))
-                    
-                    analysis = {
-                        "analysisId": session_folder.split('_')[-1] if '_' in session_folder else session_folder,
-                        "name": f"Analysis {session_folder}",
-                        "datasetName": dataset_name,
-                        "analysisType": analysis_type,
-                        "status": status,
-                        "createdDate": created_date.isoformat(),
-                        "completedDate": completed_date.isoformat() if completed_date else None,
-                        "description": description
-                    }
-                    
-                    analyses.append(analysis)
-        
-        # Sort by creation date, newest first
-        analyses.sort(key=lambda x: x["createdDate"], reverse=True)
-        
-        return analyses
-        
-    except Exception as e:
+        analyses, total = await asyncio.to_thread(
+            session_index.list_analyses, status=status, user_id=user_id, search=search, limit=limit, offset=offset
+        )
+    except sqlite3.Error as e:
         logger.error(f"Error getting previous analyses: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving previous analyses: {str(e)}")
+    
+    return FastJSONResponse(analyses, headers={"X-Total-Count": str(total)})
 
 # Debug endpoint per vedere tutte le analisi
 @app.get("/debug/analyses")
@@ -1221,7 +3675,7 @@ def debug_all_analyses():
             aid: {
                 "id": data["id"],
                 "status": data["status"],
-                "has_results": data.get("results") is not None,
+                "has_results": analysis_has_results(data),
                 "has_error": data.get("error") is not None,
                 "timestamp": data["timestamp"],
                 "error": data.get("error")
@@ -1231,70 +3685,25 @@ def debug_all_analyses():
 
 # Ottieni le opzioni di preprocessing dalle sessioni utente
 @app.get("/preprocessing-options")
-def get_preprocessing_options():
-    """Ottieni le opzioni di preprocessing disponibili da tutte le sessioni utente"""
+async def get_preprocessing_options(
+    search: Optional[str] = Query(None, description="Substring of name, description or dataset"),
+    user_id: Optional[str] = None,
+    distinct: bool = Query(True, description="One entry per distinct configuration"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Ottieni le opzioni di preprocessing disponibili da tutte le sessioni utente (dal catalogo nell'indice)"""
     try:
-        user_sessions_dir = "user_sessions"
-        preprocessing_options = []
-        
-        if not os.path.exists(user_sessions_dir):
-            return preprocessing_options
-        
-        # Scan through user session directories
-        for session_folder in os.listdir(user_sessions_dir):
-            session_path = os.path.join(user_sessions_dir, session_folder)
-            if os.path.isdir(session_path):
-                preprocessing_file = os.path.join(session_path, "preprocessing_options.json")
-                
-                if os.path.exists(preprocessing_file):
-                    try:
-                        with open(preprocessing_file, 'r', encoding='utf-8') as f:
-                            options_data = json.load(f)
-                        
-                        # Extract session info from folder name
-                        session_parts = session_folder.split('_')
-                        user_id = session_parts[0] if session_parts else 'Unknown'
-                        session_id = '_'.join(session_parts[1:]) if len(session_parts) > 1 else session_folder
-                        
-                        # Get creation date from file stats
-                        file_stats = os.stat(preprocessing_file)
-                        created_date = datetime.fromtimestamp(file_stats.st_ctime)
-                        
-                        # Extract original file name if available
-                        original_file_name = "Unknown dataset"
-                        for file in os.listdir(session_path):
-                            if file.startswith("original_"):
-                                original_file_name = file.replace("original_", "")
-                                break
-                        
-                        # Generate a descriptive name based on the configuration
-                        preprocessing_name = generate_preprocessing_name(options_data, original_file_name)
-                        
-                        preprocessing_option = {
-                            "sessionId": session_folder,  # Use full folder name as ID
-                            "userId": user_id,
-                            "name": preprocessing_name,
-                            "description": generate_preprocessing_description(options_data),
-                            "options": options_data,
-                            "createdDate": created_date.isoformat(),
-                            "originalDataset": original_file_name
-                        }
-                        
-                        preprocessing_options.append(preprocessing_option)
-                        
-                    except Exception as e:
-                        logger.warning(f"Error reading preprocessing options from {preprocessing_file}: {e}")
-                        continue
-        
-        # Sort by creation date (newest first)
-        preprocessing_options.sort(key=lambda x: x["createdDate"], reverse=True)
-        
-        logger.info(f"Found {len(preprocessing_options)} preprocessing option sets")
-        return preprocessing_options
-        
-    except Exception as e:
+        preprocessing_options, total = await asyncio.to_thread(
+            session_index.list_preprocessing_options,
+            search=search, user_id=user_id, distinct=distinct, limit=limit, offset=offset
+        )
+    except sqlite3.Error as e:
         logger.error(f"Error getting preprocessing options: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving preprocessing options: {str(e)}")
+    
+    logger.info(f"Found {total} preprocessing option sets")
+    return FastJSONResponse(preprocessing_options, headers={"X-Total-Count": str(total)})
 
 def generate_preprocessing_name(options: dict, dataset_name: str) -> str:
     """Generate a descriptive name for preprocessing options"""
@@ -1376,8 +3785,7 @@ def get_preprocessing_option_by_id(session_id: str):
             options_data = json.load(f)
         
         # Get additional session metadata
-        file_stats = os.stat(preprocessing_file)
-        created_date = datetime.fromtimestamp(file_stats.st_ctime)
+        created_date = session_created_date(session_path)
         
         # Extract original file name if available
         original_file_name = "Unknown dataset"
@@ -1468,7 +3876,7 @@ def get_session_files():
 #             return files
 #         
 #         # Scan through user session directories
-#         for session_folder in os.listdir(user_sessions_dir):
+#         for session_folder in list_session_folders(user_sessions_dir):
 #             session_path = os.path.join(user_sessions_dir, session_folder)
 #             if os.path.isdir(session_path):
 #                 
@@ -1593,6 +4001,12 @@ async def value_error_handler(request, exc: ValueError):
     )
 
 if __name__ == "__main__":
+    # python fastapi_main.py --rebuild-index: ricostruisce l'indice delle sessioni ed esce
+    if "--rebuild-index" in sys.argv:
+        count = session_index.rebuild()
+        print(f"Session index rebuilt with {count} sessions: {session_index.path}")
+        sys.exit(0)
+    
     import uvicorn
     import socket
     
@@ -16,7 +16,8 @@ import { PlotlyService } from '../../services/plotly.service';
 import { SessionService } from '../../services/session.service';
 import { PdfReportService, PdfReportData, DataFormattingMethods } from '../../services/pdf-report.service';
 import { DataSortingService } from '../../services/data-sorting.service';
-import { AnalysisRequest, AnalysisResult } from '../../models/interfaces';
+import { AnalysisProgressEvent, AnalysisRequest, AnalysisResult } from '../../models/interfaces';
+import { Subscription } from 'rxjs';
 
 @Component({
   selector: 'app-results',
@@ -42,7 +43,15 @@ import { AnalysisRequest, AnalysisResult } from '../../models/interfaces';
             <div class="analysis-info">
               <p><strong>ID Analisi:</strong> {{ analysisId() }}</p>
               <p><strong>Stato:</strong> {{ getStatusDisplayName(analysisStatus()) }}</p>
+              @if (progressMessage()) {
+                <p><strong>Avanzamento:</strong> {{ progressMessage() }}</p>
+              }
             </div>
+            @if (analysisStatus() === 'pending' || analysisStatus() === 'running') {
+              <button class="cancel-btn" (click)="cancelAnalysis()" [disabled]="cancelling()">
+                {{ cancelling() ? 'Annullamento...' : 'Annulla analisi' }}
+              </button>
+            }
           }
         </div>
       } @else if (error()) {
@@ -690,7 +699,7 @@ import { AnalysisRequest, AnalysisResult } from '../../models/interfaces';
       gap: 16px;
       justify-content: center;
     }
-    .download-btn, .new-analysis-btn, .retry-btn {
+    .download-btn, .new-analysis-btn, .retry-btn, .cancel-btn {
       padding: 12px 24px;
       border: none;
       border-radius: 6px;
@@ -723,6 +732,18 @@ import { AnalysisRequest, AnalysisResult } from '../../models/interfaces';
       background: #ef4444;
       box-shadow: 0 4px 12px rgba(248, 113, 113, 0.2);
     }
+    .cancel-btn {
+      background: white;
+      color: #b91c1c;
+      border: 1px solid #fca5a5;
+    }
+    .cancel-btn:hover:not(:disabled) {
+      background: #fef2f2;
+    }
+    .cancel-btn:disabled {
+      opacity: 0.6;
+      cursor: default;
+    }
 
     /* Section Navigation Styles */
     .section-navigation {
@@ -1249,6 +1270,11 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
   analysisStatus = signal<'pending' | 'running' | 'completed' | 'failed'>('pending');
   resultsReady = signal(false);
   showResults = signal(false);
+  progressMessage = signal<string | null>(null);
+  cancelling = signal(false);
+  private analysisEventsSubscription: Subscription | null = null;
+  private methodsCompleted = 0;
+  private methodsTotal = 0;
   forceNewAnalysis = signal(false); // Flag to force new analysis instead of loading existing
   
   // Cached test lists to prevent constant re-evaluation
@@ -2098,6 +2124,7 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
     this.analysisId.set(analysisId);
     this.analysisStatus.set('running');
     this.loading.set(true);
+    this.cancelling.set(false);
     this.error.set(null);
     
     // Update global state to reflect new analysis (clears recovery mode)
@@ -2120,8 +2147,8 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
     this.apiService.submitAnalysis(request).subscribe({
       next: (_submitResult: any) => {
         console.log('[RESULTS] Analysis submitted successfully');
-        // Start polling for analysis status
-        this.pollAnalysisStatus(analysisId);
+        // Follow status and progress live (falls back to polling if the stream is unavailable)
+        this.watchAnalysisEvents(analysisId);
       },
       error: (err: any) => {
         console.error('[RESULTS] Analysis submission failed:', err);
@@ -2138,6 +2165,76 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
     });
   }
 
+  private watchAnalysisEvents(analysisId: string) {
+    this.analysisEventsSubscription?.unsubscribe();
+    this.progressMessage.set(null);
+    this.methodsCompleted = 0;
+    this.methodsTotal = 0;
+
+    this.analysisEventsSubscription = this.apiService.streamAnalysisEvents(analysisId).subscribe({
+      next: (streamEvent) => {
+        if (streamEvent.type === 'progress') {
+          this.progressMessage.set(this.formatProgressEvent(streamEvent.data));
+          return;
+        }
+
+        const statusEvent = streamEvent.data;
+        if (statusEvent.status === 'pending') {
+          this.analysisStatus.set('pending');
+          this.progressMessage.set(statusEvent.queuePosition ? `In coda (posizione ${statusEvent.queuePosition})` : null);
+        } else if (statusEvent.status === 'running') {
+          this.analysisStatus.set('running');
+        } else if (statusEvent.status === 'completed') {
+          this.stopAnalysisEvents();
+          this.loading.set(false);
+          this.analysisStatus.set('completed');
+          this.resultsReady.set(true);
+          this.showResults.set(false); // Don't show results yet, show button instead
+        } else if (statusEvent.status === 'error') {
+          this.stopAnalysisEvents();
+          this.loading.set(false);
+          this.analysisStatus.set('failed');
+          this.error.set(statusEvent.error || 'L\'analisi è fallita. Riprova.');
+        } else if (statusEvent.status === 'cancelled') {
+          this.stopAnalysisEvents();
+          this.loading.set(false);
+          this.analysisStatus.set('failed');
+          this.error.set('L\'analisi è stata annullata.');
+        }
+      },
+      error: (err: any) => {
+        console.warn('[RESULTS] Analysis event stream unavailable, falling back to polling:', err);
+        this.analysisEventsSubscription = null;
+        this.pollAnalysisStatus(analysisId);
+      }
+    });
+  }
+
+  private stopAnalysisEvents() {
+    this.analysisEventsSubscription?.unsubscribe();
+    this.analysisEventsSubscription = null;
+  }
+
+  private formatProgressEvent(progress: AnalysisProgressEvent): string | null {
+    switch (progress.event) {
+      case 'methods_planned':
+        this.methodsTotal = progress.total ?? 0;
+        this.methodsCompleted = 0;
+        return `0 di ${this.methodsTotal} metodi completati`;
+      case 'method_started':
+        return `${progress.method} in esecuzione`;
+      case 'cv_fold':
+        return `${progress.method}: cross-validation fold ${progress.fold} di ${progress.folds}`;
+      case 'boruta_iteration':
+        return `${progress.method}: iterazione ${progress.iteration} di ${progress.max_runs}`;
+      case 'method_finished':
+        this.methodsCompleted++;
+        return `${this.methodsCompleted} di ${this.methodsTotal} metodi completati`;
+      default:
+        return this.progressMessage();
+    }
+  }
+
   private pollAnalysisStatus(analysisId: string) {
     // Polling for status every 30 seconds
     const pollInterval = 30000; // 30 seconds
@@ -2167,6 +2264,10 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
             this.loading.set(false);
             this.analysisStatus.set('failed');
             this.error.set(response.error || 'L\'analisi Ã¨ fallita. Riprova.');
+          } else if (response.status === 'cancelled') {
+            this.loading.set(false);
+            this.analysisStatus.set('failed');
+            this.error.set('L\'analisi è stata annullata.');
           } else {
             // Unknown status, continue polling
             setTimeout(poll, pollInterval);
@@ -2876,6 +2977,32 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
     this.submitAnalysis();
   }
 
+  // Stops a queued or running analysis (the backend kills the R process and frees its slot)
+  cancelAnalysis() {
+    const analysisId = this.analysisId();
+    if (!analysisId || this.cancelling()) {
+      return;
+    }
+    this.cancelling.set(true);
+    this.apiService.cancelAnalysis(analysisId).subscribe({
+      next: () => {
+        this.cancelling.set(false);
+        this.stopAnalysisEvents();
+        this.loading.set(false);
+        this.analysisStatus.set('failed');
+        this.error.set('L\'analisi è stata annullata.');
+      },
+      error: (err: any) => {
+        this.cancelling.set(false);
+        // 409: the analysis finished in the meantime, its final status arrives from the stream/polling
+        if (err.status !== 409) {
+          console.error('[RESULTS] Analysis cancellation failed:', err);
+          this.progressMessage.set('Annullamento non riuscito, riprova');
+        }
+      }
+    });
+  }
+
   getStatusDisplayName(status: string): string {
     const statusMap: { [key: string]: string } = {
       'pending': 'In attesa',
@@ -3155,6 +3282,7 @@ export class ResultsComponent implements OnInit, AfterViewInit, AfterViewChecked
   ngOnDestroy() {
     // Reset analysis active state to allow navigation when leaving results
     this.navigationService.setAnalysisActiveState(false);
+    this.stopAnalysisEvents();
     
     // Clean up Plotly plots
     if (this.distributionPlot?.nativeElement) {
@@ -118,7 +118,7 @@ export interface AnalysisRequest {
 
 export interface AnalysisResult {
   id: string;
-  status: 'pending' | 'completed' | 'error';
+  status: 'pending' | 'running' | 'completed' | 'error' | 'cancelled';
   results?: any;
   summary_results?: any[];
   error?: string;
@@ -128,6 +128,33 @@ export interface AnalysisResult {
   time_end?: string | Date;
 }
 
+// Progress event written by analysis.R and relayed by /analysis/{id}/events
+export interface AnalysisProgressEvent {
+  event: 'methods_planned' | 'method_started' | 'method_finished' | 'cv_fold' | 'boruta_iteration' | 'analysis_finished';
+  time: string;
+  method?: string;
+  methods?: string[];
+  total?: number;
+  status?: string;
+  error?: string;
+  checkpoint?: boolean;
+  fold?: number;
+  folds?: number;
+  iteration?: number;
+  max_runs?: number;
+}
+
+export interface AnalysisStatusEvent {
+  id: string;
+  status: 'pending' | 'running' | 'completed' | 'error' | 'cancelled';
+  queuePosition: number | null;
+  error: string | null;
+}
+
+export type AnalysisStreamEvent =
+  | { type: 'status'; data: AnalysisStatusEvent }
+  | { type: 'progress'; data: AnalysisProgressEvent };
+
 export interface NavItem {
   id: string;
   label: string;
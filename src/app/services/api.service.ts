@@ -1,7 +1,7 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
 import { Observable, tap } from 'rxjs';
-import { AnalysisRequest, AnalysisResult, PreprocessingOptions } from '../models/interfaces';
+import { AnalysisRequest, AnalysisResult, AnalysisStreamEvent, PreprocessingOptions } from '../models/interfaces';
 import { SessionService } from './session.service';
 
 @Injectable({
@@ -96,6 +96,29 @@ export class ApiService {
     return this.http.get<AnalysisResult>(`${this.baseUrl}/status/${analysisId}`);
   }
 
+  // Stops a queued or running analysis (the R process is terminated server-side)
+  cancelAnalysis(analysisId: string): Observable<AnalysisResult> {
+    return this.http.delete<AnalysisResult>(`${this.baseUrl}/analysis/${analysisId}`);
+  }
+
+  // Live status and progress events (Server-Sent Events), used instead of polling /status
+  streamAnalysisEvents(analysisId: string): Observable<AnalysisStreamEvent> {
+    return new Observable<AnalysisStreamEvent>(observer => {
+      const source = new EventSource(`${this.baseUrl}/analysis/${analysisId}/events`);
+      source.addEventListener('status', (message: MessageEvent) => {
+        observer.next({ type: 'status', data: JSON.parse(message.data) });
+      });
+      source.addEventListener('progress', (message: MessageEvent) => {
+        observer.next({ type: 'progress', data: JSON.parse(message.data) });
+      });
+      source.onerror = () => {
+        source.close();
+        observer.error(new Error('Analysis event stream interrupted'));
+      };
+      return () => source.close();
+    });
+  }
+
   getAnalysisResults(analysisId: string): Observable<AnalysisResult> {
     return this.http.get<AnalysisResult>(`${this.baseUrl}/results/${analysisId}`);
   }